@@ -1,10 +1,25 @@
 import os
 import logging
-from flask import Flask, render_template, request, jsonify, send_file, flash, redirect, url_for
+from flask import Flask, Response, render_template, request, jsonify, flash, redirect, url_for
 from video_downloader_proxy_fix import VideoDownloader
+from download_scheduler import download_scheduler, QueueFullError, connection_budget
+from info_cache import info_cache, info_dict_store
+from file_store import file_store
+from file_serving import file_response, offload_response, set_disposition
+from progress_store import ProgressStore
+from download_ids import new_download_id
+from memory_policy import memory_policy
+from conversion import conversion_executor
+from job_journal import job_journal
+from ydl_pool import ydl_pool
+from ytdlp_cache import ytdlp_cache
+from strategy_race import strategy_racer
+from extractor_pool import extractor_pool
+from deadline import Deadline
 import tempfile
 import threading
-import time
+import shutil
+import socket
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -12,242 +27,414 @@ logging.basicConfig(level=logging.DEBUG)
 app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key-change-in-production")
 
-# Global dictionary to store download progress (memory optimized)
-download_progress = {}
+# Tuned GC thresholds and pause metrics; collections are driven by RSS, not by requests
+memory_policy.install()
+
+# Thread-safe, size-capped registry of download progress (PROGRESS_BACKEND=sqlite shares it between workers)
+progress_store = ProgressStore()
+
+# Identifies this machine in progress records so file requests can be sent where the file is
+NODE_ID = os.environ.get('CLOVIX_NODE_ID') or socket.gethostname()
+# e.g. "http://{node}.internal:5000{path}"; unset means every node serves only its own files
+NODE_URL_TEMPLATE = os.environ.get('NODE_URL_TEMPLATE')
+# End-to-end time budgets: analyzing a URL, and running one download job once it leaves the queue
+INFO_DEADLINE = float(os.environ.get('INFO_DEADLINE', 90))
+DOWNLOAD_DEADLINE = float(os.environ.get('DOWNLOAD_DEADLINE', 3600))
+# Longest a /download_events long-poll waits for a change; must stay under gunicorn's worker timeout
+LONG_POLL_TIMEOUT = float(os.environ.get('LONG_POLL_TIMEOUT', 20))
 
 # Memory optimization: Clean up old download records
-import gc
 import atexit
 
 def cleanup_memory():
-    """Clean up memory and old download records"""
-    global download_progress
-    download_progress.clear()
-    gc.collect()
+    """Clean up old download records"""
+    # Records in a shared backend still belong to the other workers
+    if not progress_store.backend.shared:
+        progress_store.clear()
 
 # Register cleanup on app exit
 atexit.register(cleanup_memory)
 
+def update_queue_position(download_id, position):
+    """Reflect a job's place in the download queue in its progress entry"""
+    progress = progress_store.get(download_id)
+    if progress is not None and progress.get('status') == 'queued':
+        progress_store.update(download_id, queue_position=position)
+
+# Bounded worker pool shared by all download requests
+download_scheduler.on_queue_change = update_queue_position
+
+# Streams hold a connection and a yt-dlp process for their whole duration
+stream_slots = threading.BoundedSemaphore(int(os.environ.get('STREAM_MAX_CONCURRENT', 8)))
+
+def serves_concurrently():
+    """Whether this server can hold a response open without stalling every other request
+
+    gunicorn's default sync worker serves one request at a time and is killed when a long
+    response keeps it from its heartbeat; threaded servers (gthread, the dev server) and
+    asgi.py are not.
+    """
+    return bool(request.environ.get('wsgi.multithread') or request.environ.get('clovix.asgi'))
+
 @app.route('/')
 def index():
-    return render_template('index.html')
+    # Only the ASGI server (asgi.py) streams events; only a server that serves concurrently can hold a poll open
+    if request.environ.get('clovix.asgi'):
+        progress_events = 'sse'
+    elif serves_concurrently():
+        progress_events = 'long-poll'
+    else:
+        progress_events = 'poll'
+    return render_template('index.html', progress_events=progress_events)
 
-@app.route('/get_video_info', methods=['POST'])
-def get_video_info():
+# JSON route handlers shared with the ASGI entry point (asgi.py); each returns (payload, status, headers)
+
+def fetch_video_info(data):
+    """Analyze a URL; blocks for the whole yt-dlp extraction"""
     try:
-        if not request.json:
-            return jsonify({'error': 'No JSON data provided'}), 400
+        if not data:
+            return {'error': 'No JSON data provided'}, 400, {}
             
-        url = request.json.get('url', '').strip() if request.json else ''
+        url = data.get('url', '').strip()
         if not url:
-            return jsonify({'error': 'Please provide a valid URL'}), 400
+            return {'error': 'Please provide a valid URL'}, 400, {}
         
         logging.info(f"Analyzing URL: {url}")
         
         # Memory optimization: Use context manager
         downloader = VideoDownloader()
-        video_info = downloader.get_video_info(url)
+        video_info = downloader.get_video_info(url, deadline=Deadline(INFO_DEADLINE))
         
-        # Clean up after each request
-        gc.collect()
+        # Collect only if this request pushed memory over the watermark
+        memory_policy.maybe_collect()
+        
+        if video_info.get('timed_out'):
+            logging.error(f"Video info timed out for: {url}")
+            return video_info, 504, {}
         
         if 'error' in video_info:
             logging.error(f"Video info error: {video_info['error']}")
             # Don't return 400 for user-facing errors like bot detection
             # Return 200 with error message so frontend can handle it properly
-            return jsonify(video_info), 200
+            return video_info, 200, {}
         
         logging.info(f"Video info retrieved successfully for: {video_info.get('title', 'Unknown')}")
-        return jsonify(video_info)
+        return video_info, 200, {}
     
     except Exception as e:
         logging.error(f"Error getting video info: {str(e)}", exc_info=True)
-        return jsonify({'error': f'Failed to get video information: {str(e)}'}), 500
+        return {'error': f'Failed to get video information: {str(e)}'}, 500, {}
 
-@app.route('/download_video', methods=['POST'])
-def download_video():
+def start_download(data):
+    """Queue a download (or attach to an identical one) and return its id"""
     try:
-        data = request.json
         url = data.get('url', '').strip()
         format_id = data.get('format_id')
         audio_only = data.get('audio_only', False)
         file_format = data.get('file_format', 'mp4')
+        info_token = data.get('info_token')
         
         if not url:
-            return jsonify({'error': 'Please provide a valid URL'}), 400
+            return {'error': 'Please provide a valid URL'}, 400, {}
         
-        downloader = VideoDownloader()
+        # Time-ordered ID that stays unique across threads and workers
+        download_id = new_download_id()
         
-        # Generate unique download ID with timestamp
-        download_id = str(int(time.time() * 1000))
-        download_progress[download_id] = {
-            'progress': 0, 
-            'status': 'starting',
-            'timestamp': time.time(),
-            'active': True  # Mark as active to prevent cleanup
-        }
+        # Stable work dir so the job can resume from its partial file after a restart
+        downloader = VideoDownloader(work_dir=job_journal.work_dir(download_id))
+        video_key = downloader.canonical_id(url)
         
-        def progress_hook(d):
-            # Always check if download_id exists before updating
-            if download_id not in download_progress:
-                return
-                
-            if d['status'] == 'downloading':
-                try:
-                    percent = d.get('_percent_str', '0%').replace('%', '')
-                    if percent:
-                        download_progress[download_id]['progress'] = float(percent)
-                    download_progress[download_id]['status'] = 'downloading'
-                except (ValueError, TypeError):
-                    pass
-            elif d['status'] == 'finished':
-                download_progress[download_id]['progress'] = 100
-                download_progress[download_id]['status'] = 'finished'
-                download_progress[download_id]['filename'] = d['filename']
-                logging.info(f"Download finished: {d['filename']}")
-            elif d['status'] == 'error':
-                download_progress[download_id]['status'] = 'error'
-                download_progress[download_id]['error'] = d.get('error', 'Unknown error')
+        # Serve repeat requests straight from the managed file store
+        store_key = file_store.key(video_key, format_id, file_format, audio_only)
+        stored_path = file_store.lookup(store_key)
+        if stored_path:
+            shutil.rmtree(downloader.temp_dir, ignore_errors=True)
+            progress_store.create(
+                download_id,
+                progress=100,
+                status='finished',
+                file_path=stored_path,
+                filename=stored_path,
+                cached=True,
+                active=False,
+                node=NODE_ID
+            )
+            logging.info(f"Serving {download_id} from file store: {stored_path}")
+            return {'download_id': download_id, 'queue_position': 0}, 200, {}
         
-        # Start download in background thread
-        def download_thread():
-            try:
-                # Ensure download_id exists at start
-                if download_id not in download_progress:
-                    download_progress[download_id] = {
-                        'status': 'downloading',
-                        'progress': 0,
-                        'timestamp': time.time()
-                    }
-                
-                logging.info(f"Starting download for download_id: {download_id}")
-                logging.info(f"Download parameters: url={url}, format_id={format_id}, audio_only={audio_only}, file_format={file_format}")
-                result = downloader.download_video(url, format_id, audio_only, file_format, progress_hook)
-                logging.info(f"Download result: {result}")
-                
-                # Always ensure download_id exists before updating
-                if download_id not in download_progress:
-                    logging.warning(f"Download ID {download_id} was missing, recreating entry")
-                    download_progress[download_id] = {
-                        'status': 'processing',
-                        'progress': 0,
-                        'timestamp': time.time(),
-                        'active': True
-                    }
-                
-                if result is None:
-                    download_progress[download_id]['status'] = 'error'
-                    download_progress[download_id]['error'] = 'Download failed - no result returned'
-                    download_progress[download_id]['active'] = False
-                    logging.error(f"Download failed - no result for {download_id}")
-                elif isinstance(result, dict) and 'error' in result:
-                    download_progress[download_id]['status'] = 'error'
-                    download_progress[download_id]['error'] = result['error']
-                    download_progress[download_id]['active'] = False
-                    logging.error(f"Download error for {download_id}: {result['error']}")
-                elif isinstance(result, dict):
-                    # Update with all result data
-                    download_progress[download_id].update(result)
-                    download_progress[download_id]['status'] = 'finished'
-                    download_progress[download_id]['progress'] = 100
-                    download_progress[download_id]['active'] = False
-                    
-                    # Ensure filename is set properly
-                    if 'file_path' in result:
-                        download_progress[download_id]['filename'] = result['file_path']
-                        logging.info(f"Download completed for {download_id}: {result['file_path']}")
-                    elif 'filename' in result:
-                        download_progress[download_id]['filename'] = result['filename']
-                        logging.info(f"Download completed for {download_id}: {result['filename']}")
-                    else:
-                        logging.error(f"No filename in result for {download_id}")
-                else:
-                    download_progress[download_id]['status'] = 'error'
-                    download_progress[download_id]['error'] = 'Unknown download result format'
-                    download_progress[download_id]['active'] = False
-                
-            except Exception as e:
-                logging.error(f"Download thread error: {str(e)}")
-                # Only update if download_id still exists
-                if download_id in download_progress:
-                    download_progress[download_id]['error'] = str(e)
-                    download_progress[download_id]['status'] = 'error'
-                    download_progress[download_id]['active'] = False  # Mark for cleanup
-            finally:
-                # Memory cleanup after download
-                gc.collect()
-        
-        thread = threading.Thread(target=download_thread)
-        thread.daemon = True
-        thread.start()
-        
-        return jsonify({'download_id': download_id})
+        params = {
+            'url': url,
+            'format_id': format_id,
+            'audio_only': audio_only,
+            'file_format': file_format,
+            'info_token': info_token,
+            'video_key': video_key,
+            'store_key': store_key,
+        }
+        return queue_download(download_id, downloader, params)
     
     except Exception as e:
         logging.error(f"Error starting download: {str(e)}")
-        return jsonify({'error': f'Failed to start download: {str(e)}'}), 500
+        return {'error': f'Failed to start download: {str(e)}'}, 500, {}
 
-@app.route('/download_progress/<download_id>')
-def get_download_progress(download_id):
-    # Never clean up during progress requests to avoid race conditions
+def queue_download(download_id, downloader, params, resumed_bytes=None):
+    """Journal and queue a download job; shared by new requests and jobs resumed after a restart"""
+    url, format_id, audio_only = params['url'], params['format_id'], params['audio_only']
+    file_format, info_token = params['file_format'], params['info_token']
+    video_key, store_key = params['video_key'], params['store_key']
+    resumed = resumed_bytes is not None
+    
+    progress_store.create(
+        download_id,
+        progress=0,
+        status='queued',
+        active=True,  # Mark as active to prevent cleanup
+        resumed=resumed or None,
+        resumed_bytes=resumed_bytes,
+        node=NODE_ID
+    )
+    
+    last_published = {'status': None, 'percent': None}
     
-    if download_id not in download_progress:
-        # If download not found, check if it's very recent and recreate
+    def progress_hook(d):
+        if d['status'] == 'downloading':
+            try:
+                percent = float(d.get('_percent_str', '0%').replace('%', '') or 0)
+            except (ValueError, TypeError):
+                return
+            # Only whole-percent steps and status changes are worth recording and pushing
+            if ('downloading', int(percent)) == (last_published['status'], last_published['percent']):
+                return
+            last_published['status'], last_published['percent'] = 'downloading', int(percent)
+            progress_store.update(download_id, progress=percent, status='downloading')
+        elif d['status'] == 'finished':
+            # yt-dlp is done with one stream; merging or conversion may still follow
+            last_published['status'] = 'processing'
+            progress_store.update(download_id, progress=100, status='processing', filename=d['filename'])
+            logging.info(f"Download finished: {d['filename']}")
+        elif d['status'] == 'converting':
+            if ('converting', int(d['percent'])) == (last_published['status'], last_published['percent']):
+                return
+            last_published['status'], last_published['percent'] = 'converting', int(d['percent'])
+            progress_store.update(download_id, progress=d['percent'], status='converting')
+        elif d['status'] == 'error':
+            last_published['status'] = 'error'
+            progress_store.update(download_id, status='error', error=d.get('error', 'Unknown error'))
+    
+    # Start download in background thread
+    def download_thread():
+        final = {'status': 'error', 'active': False}
         try:
-            timestamp = int(download_id) / 1000.0
-            if time.time() - timestamp < 60:  # If less than 1 minute old
-                download_progress[download_id] = {
-                    'status': 'starting',
-                    'progress': 0,
-                    'timestamp': timestamp,
-                    'active': True
-                }
-                logging.info(f"Recreated missing download entry for {download_id}")
-        except:
-            pass
+            # Recreate the record if it was evicted while the job waited in the queue
+            status = 'resumed' if resumed else 'starting'
+            if not progress_store.update(download_id, status=status, queue_position=0):
+                progress_store.create(download_id, status=status, progress=0, queue_position=0, active=True,
+                                      node=NODE_ID)
+            
+            logging.info(f"Starting download for download_id: {download_id}")
+            logging.info(f"Download parameters: url={url}, format_id={format_id}, audio_only={audio_only}, file_format={file_format}")
+            # Reuse the info_dict from the analyze step instead of re-extracting
+            info_dict = info_dict_store.get(info_token, video_key)
+            if info_dict:
+                logging.info(f"Reusing analyzed info for download_id: {download_id}")
+            result = downloader.download_video(url, format_id, audio_only, file_format, progress_hook, info_dict=info_dict,
+                                               deadline=Deadline(DOWNLOAD_DEADLINE))
+            logging.info(f"Download result: {result}")
+            
+            if result is None:
+                final['error'] = 'Download failed - no result returned'
+                logging.error(f"Download failed - no result for {download_id}")
+            elif isinstance(result, dict) and 'error' in result:
+                final['error'] = result['error']
+                if result.get('timed_out'):
+                    final['timed_out'] = True
+                logging.error(f"Download error for {download_id}: {result['error']}")
+            elif isinstance(result, dict):
+                # Move the finished file into the managed store so repeat requests reuse it
+                if result.get('file_path'):
+                    stored_path = file_store.add(store_key, result['file_path'])
+                    if stored_path:
+                        result['file_path'] = stored_path
+                        result['filename'] = os.path.basename(stored_path)
+                
+                # Update with all result data
+                final = dict(result, status='finished', progress=100, active=False)
+                
+                # Ensure filename is set properly
+                if 'file_path' in result:
+                    final['filename'] = result['file_path']
+                    logging.info(f"Download completed for {download_id}: {result['file_path']}")
+                elif 'filename' in result:
+                    logging.info(f"Download completed for {download_id}: {result['filename']}")
+                else:
+                    logging.error(f"No filename in result for {download_id}")
+            else:
+                final['error'] = 'Unknown download result format'
+            
+        except Exception as e:
+            logging.error(f"Download thread error: {str(e)}")
+            final = {'status': 'error', 'error': str(e), 'active': False}  # Mark for cleanup
+        finally:
+            if not progress_store.update(download_id, **final):
+                progress_store.create(download_id, node=NODE_ID, **final)
+            # The job is settled either way; a restart must not pick it up again
+            job_journal.finish(download_id)
+            # Remove the per-job temp dir unless the result still lives in it
+            file_path = final.get('file_path') or ''
+            if not file_path.startswith(downloader.temp_dir):
+                shutil.rmtree(downloader.temp_dir, ignore_errors=True)
+            # Memory cleanup after download, only when memory is high
+            memory_policy.maybe_collect()
+    
+    # Identical in-flight requests attach to the same job and share its progress and file
+    dedupe_key = (video_key, format_id, bool(audio_only), file_format)
+    
+    # Journal the job before it can start so a crash at any point leaves it resumable
+    job_journal.record(download_id, params)
+    
+    # Queue the download on the bounded worker pool; resumed jobs go ahead of new ones
+    try:
+        job_id = download_scheduler.submit(download_id, download_thread, dedupe_key=dedupe_key,
+                                           priority=-1 if resumed else 0)
+    except QueueFullError as e:
+        progress_store.delete(download_id)
+        if resumed:
+            # Keep the partial download for the next restart
+            job_journal.release(download_id)
+        else:
+            job_journal.discard(download_id, downloader.temp_dir)
+        logging.warning(f"Rejecting download {download_id}: {str(e)}")
+        return {'error': 'Server is busy, please try again in a moment.'}, 429, {'Retry-After': '30'}
     
-    progress = download_progress.get(download_id, {'error': 'Download not found'})
-    return jsonify(progress)
+    if job_id != download_id:
+        progress_store.delete(download_id)
+        job_journal.discard(download_id, downloader.temp_dir)
+        logging.info(f"Coalesced download {download_id} into in-flight job {job_id}")
+    
+    return {
+        'download_id': job_id,
+        'queue_position': download_scheduler.position(job_id)
+    }, 200, {}
+
+
+
+def progress_snapshot(download_id):
+    progress = progress_store.get(download_id)
+    if progress is None:
+        return {'error': 'Download not found'}, 404, {}
+    return progress, 200, {}
+
+def service_stats():
+    return {
+        'info_cache': info_cache.stats(),
+        'info_dicts': info_dict_store.stats(),
+        'downloads': download_scheduler.stats(),
+        'file_store': file_store.stats(),
+        'progress': progress_store.stats(),
+        'memory': memory_policy.stats(),
+        'conversions': conversion_executor.stats(),
+        'connections': connection_budget.stats(),
+        'jobs': job_journal.stats(),
+        'ydl_pool': ydl_pool.stats(),
+        'ytdlp_cache': ytdlp_cache.stats(),
+        'extraction_race': strategy_racer.stats(),
+        'extractor_pool': extractor_pool.stats(),
+    }, 200, {}
 
-def cleanup_old_downloads():
-    """Remove only inactive downloads that are truly old"""
-    current_time = time.time()
-    to_remove = []
+@app.route('/get_video_info', methods=['POST'])
+def get_video_info():
+    payload, status, headers = fetch_video_info(request.get_json(silent=True))
+    return jsonify(payload), status, headers
+
+@app.route('/download_video', methods=['POST'])
+def download_video():
+    payload, status, headers = start_download(request.get_json(silent=True) or {})
+    return jsonify(payload), status, headers
+
+@app.route('/stream_video')
+def stream_video():
+    """Send a progressive format to the client while yt-dlp is still downloading it"""
+    url = request.args.get('url', '').strip()
+    format_id = request.args.get('format_id')
+    audio_only = request.args.get('audio_only', '').lower() in ['1', 'true', 'yes']
+    info_token = request.args.get('info_token')
+    
+    if not url:
+        return jsonify({'error': 'Please provide a valid URL'}), 400
+    
+    # A stream lasts as long as the video; only a server that keeps serving meanwhile can carry it
+    if not serves_concurrently():
+        return jsonify({'error': 'Streaming needs a threaded or ASGI server; use /download_video instead.'}), 503
     
-    for download_id, info in download_progress.items():
-        # Only clean up inactive downloads
-        if not info.get('active', False):
-            # Remove completed downloads after 5 minutes
-            if info.get('status') in ['finished', 'error'] and current_time - info.get('timestamp', 0) > 300:
-                to_remove.append(download_id)
-            # Remove any inactive download older than 10 minutes
-            elif current_time - info.get('timestamp', 0) > 600:
-                to_remove.append(download_id)
+    if not stream_slots.acquire(blocking=False):
+        response = jsonify({'error': 'Too many streaming downloads, please try again in a moment.'})
+        response.headers['Retry-After'] = '30'
+        return response, 429
+    
+    try:
+        downloader = VideoDownloader()
+        shutil.rmtree(downloader.temp_dir, ignore_errors=True)
+        info_dict = info_dict_store.get(info_token, downloader.canonical_id(url))
+        
+        logging.info(f"Streaming {url} (format_id={format_id}, audio_only={audio_only})")
+        stream = downloader.stream_video(url, format_id, audio_only, info_dict=info_dict,
+                                         deadline=Deadline(DOWNLOAD_DEADLINE))
+        if 'error' in stream:
+            stream_slots.release()
+            return jsonify({'error': stream['error']}), 504 if stream.get('timed_out') else 502
+    except Exception as e:
+        stream_slots.release()
+        logging.error(f"Error starting stream: {str(e)}")
+        return jsonify({'error': f'Failed to start stream: {str(e)}'}), 500
     
-    for download_id in to_remove:
-        download_progress.pop(download_id, None)
-        logging.info(f"Cleaned up old download: {download_id}")
+    def finish_stream():
+        stream['close']()
+        stream_slots.release()
     
-    if to_remove:
-        gc.collect()
+    response = Response(stream['chunks'], mimetype=stream['mimetype'])
+    response.call_on_close(finish_stream)
+    set_disposition(response, stream['filename'])
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
-# Schedule cleanup every 10 minutes instead of every request
-import threading
-def periodic_cleanup():
-    import time
-    while True:
-        time.sleep(600)  # 10 minutes
-        cleanup_old_downloads()
+@app.route('/download_progress/<download_id>')
+def get_download_progress(download_id):
+    payload, status, headers = progress_snapshot(download_id)
+    return jsonify(payload), status, headers
+
+@app.route('/download_events/<download_id>')
+def download_events(download_id):
+    """Conditional poll for the next progress update of one download
 
-# Start cleanup thread
-cleanup_thread = threading.Thread(target=periodic_cleanup, daemon=True)
-cleanup_thread.start()
+    Answers as soon as the progress version differs from the ETag sent in If-None-Match.
+    A threaded server holds an unchanged poll for up to LONG_POLL_TIMEOUT seconds before
+    answering 304; a sync worker answers at once and the client waits before asking
+    again. asgi.py serves this path as a Server-Sent Events stream instead.
+    """
+    if progress_store.get(download_id) is None:
+        return jsonify({'error': 'Download not found'}), 404
+    
+    last_version = None
+    for tag in request.if_none_match.as_set():
+        if tag.isdigit():
+            last_version = int(tag)
+    
+    # Holding a sync worker would stall every other request until the poll ends
+    timeout = LONG_POLL_TIMEOUT if serves_concurrently() else 0
+    progress, version = progress_store.wait_for_change(download_id, last_version, timeout=timeout)
+    if progress is None:
+        return jsonify({'error': 'Download not found'}), 404
+    
+    response = Response(status=304) if version == last_version else jsonify(progress)
+    response.set_etag(str(version))
+    response.headers['Cache-Control'] = 'no-store'
+    return response
 
 @app.route('/download_file/<download_id>')
 def download_file(download_id):
     try:
         logging.info(f"Download request for ID: {download_id}")
-        progress = download_progress.get(download_id)
+        progress = progress_store.get(download_id)
         logging.info(f"Progress data: {progress}")
         
         if not progress:
@@ -263,6 +450,10 @@ def download_file(download_id):
         logging.info(f"Attempting to serve file: {file_path}")
         
         if not os.path.exists(file_path):
+            node = progress.get('node')
+            if NODE_URL_TEMPLATE and node and node != NODE_ID:
+                logging.info(f"Redirecting download {download_id} to node {node}")
+                return redirect(NODE_URL_TEMPLATE.format(node=node, path=request.full_path.rstrip('?')), code=307)
             logging.error(f"File does not exist: {file_path}")
             return jsonify({'error': 'File not found on disk'}), 404
         
@@ -275,12 +466,60 @@ def download_file(download_id):
         original_name = os.path.basename(file_path)
         logging.info(f"Serving file: {file_path} as: {original_name}")
         
-        return send_file(file_path, as_attachment=True, download_name=original_name)
+        # With FILE_OFFLOAD set the front proxy sends the file and this worker is free at once
+        offloaded = offload_response(file_path, original_name, file_store.root)
+        if offloaded:
+            logging.info(f"Offloading {download_id} to the front proxy")
+            return offloaded
+        
+        # Pinned until the server closes the file, so store eviction never deletes it mid-transfer
+        return file_response(request.environ, file_path, original_name, opener=file_store.open_pinned)
     
     except Exception as e:
         logging.error(f"Error downloading file: {str(e)}")
         return jsonify({'error': f'Failed to download file: {str(e)}'}), 500
 
+@app.route('/stats')
+def stats():
+    payload, status, headers = service_stats()
+    return jsonify(payload), status, headers
+
+# Process that has claimed the orphaned jobs; each serving process claims once
+orphans_claimed_by = None
+orphans_lock = threading.Lock()
+
+def resume_orphaned_downloads():
+    """Requeue downloads a previous process was running when it stopped
+
+    Runs in the first request a process serves (and at asgi.py startup), never at import:
+    a gunicorn --preload master or the debug reloader's parent would run the jobs where
+    no request can see their progress.
+    """
+    global orphans_claimed_by
+    with orphans_lock:
+        if orphans_claimed_by == os.getpid():
+            return
+        orphans_claimed_by = os.getpid()
+    
+    for download_id, params, partial_bytes in job_journal.claim_orphans():
+        try:
+            downloader = VideoDownloader(work_dir=job_journal.work_dir(download_id))
+            queue_download(download_id, downloader, params, resumed_bytes=partial_bytes)
+            logging.info(f"Resuming download {download_id} with {partial_bytes} bytes already on disk")
+        except Exception as e:
+            logging.error(f"Could not resume download {download_id}: {str(e)}")
+            job_journal.release(download_id)
+
+@app.before_request
+def resume_orphans_on_first_request():
+    resume_orphaned_downloads()
+
+# Fetch current YouTube player data once so the first extractions find it cached
+ytdlp_cache.warm_up()
+
+# Everything created during startup is long-lived; keep it out of every future collection
+memory_policy.freeze_startup()
+
 # For Vercel deployment
 app.wsgi_app = app.wsgi_app
 
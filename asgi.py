@@ -0,0 +1,249 @@
+# Async entry point: run with any ASGI server, e.g. `uvicorn asgi:app --workers 2`
+#
+# Slow JSON routes are served here and their blocking work runs on executors, so
+# thousands of requests waiting on yt-dlp cost a coroutine each instead of a
+# worker. Every other route is handed to the Flask app through a small WSGI bridge.
+
+import io
+import os
+import re
+import sys
+import json
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from app import (app as flask_app, fetch_video_info, start_download, progress_snapshot, service_stats, progress_store,
+                 resume_orphaned_downloads)
+
+# Extraction can take 5-20s per strategy; only these threads can be tied up by it
+extract_executor = ThreadPoolExecutor(max_workers=int(os.environ.get('ASGI_EXTRACT_WORKERS', 32)),
+                                      thread_name_prefix='asgi-extract')
+# Short blocking work: queueing downloads, shared-store reads and delegated Flask routes
+blocking_executor = ThreadPoolExecutor(max_workers=int(os.environ.get('ASGI_BLOCKING_WORKERS', 16)),
+                                       thread_name_prefix='asgi-blocking')
+
+MAX_BODY_BYTES = 1024 * 1024
+SSE_POLL_INTERVAL = float(os.environ.get('SSE_POLL_INTERVAL', 0.5))
+SSE_KEEPALIVE = 15
+
+
+class _BodyTooLarge(Exception):
+    pass
+
+
+_PROGRESS_ROUTE = re.compile(r'^/download_progress/([^/]+)$')
+_EVENTS_ROUTE = re.compile(r'^/download_events/([^/]+)$')
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await _lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+
+    try:
+        body = await _read_body(receive)
+    except _BodyTooLarge:
+        await _send_json(send, {'error': 'Request body too large'}, 413, {})
+        return
+    if body is None:
+        return
+
+    # Notices the client going away while a long response is being produced
+    disconnected = asyncio.Event()
+    watcher = asyncio.create_task(_watch_disconnect(receive, disconnected))
+    try:
+        await _dispatch(scope, body, send, disconnected)
+    finally:
+        watcher.cancel()
+
+
+async def _dispatch(scope, body, send, disconnected):
+    method, path = scope['method'], scope['path']
+
+    if method == 'POST' and path == '/get_video_info':
+        await _send_json(send, *await _run(extract_executor, fetch_video_info, _parse_json(body)))
+    elif method == 'POST' and path == '/download_video':
+        await _send_json(send, *await _run(blocking_executor, start_download, _parse_json(body) or {}))
+    elif method == 'GET' and _PROGRESS_ROUTE.match(path):
+        await _send_json(send, *await _store_call(progress_snapshot, _PROGRESS_ROUTE.match(path).group(1)))
+    elif method == 'GET' and _EVENTS_ROUTE.match(path):
+        await _download_events(send, _EVENTS_ROUTE.match(path).group(1), disconnected)
+    elif method == 'GET' and path == '/stats':
+        await _send_json(send, *await _store_call(service_stats))
+    else:
+        await _call_wsgi(scope, body, send, disconnected)
+
+
+async def _run(executor, fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+
+
+async def _store_call(fn, *args):
+    # In-memory progress reads are instant; a shared backend may wait on a file lock
+    if progress_store.backend.shared:
+        return await _run(blocking_executor, fn, *args)
+    return fn(*args)
+
+
+async def _download_events(send, download_id, disconnected):
+    """Server-Sent Events stream of progress updates, polled without holding a thread"""
+    progress, version = await _store_call(progress_store.snapshot, download_id)
+    if progress is None:
+        await _send_json(send, {'error': 'Download not found'}, 404, {})
+        return
+
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [
+            (b'content-type', b'text/event-stream; charset=utf-8'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),
+        ],
+    })
+
+    last_version = None
+    idle = 0.0
+    while not disconnected.is_set():
+        if progress is None:
+            await _send_chunk(send, f"data: {json.dumps({'error': 'Download not found'})}\n\n")
+            break
+
+        if version != last_version:
+            last_version, idle = version, 0.0
+            await _send_chunk(send, f"id: {version}\ndata: {json.dumps(progress)}\n\n")
+            if progress.get('status') in ['finished', 'error'] and not progress.get('active'):
+                break
+        elif idle >= SSE_KEEPALIVE:
+            # Keep proxies from closing an idle connection
+            idle = 0.0
+            await _send_chunk(send, ": keepalive\n\n")
+
+        await asyncio.sleep(SSE_POLL_INTERVAL)
+        idle += SSE_POLL_INTERVAL
+        progress, version = await _store_call(progress_store.snapshot, download_id)
+
+    await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+
+
+async def _call_wsgi(scope, body, send, disconnected):
+    """Run the Flask app for one request, pulling each body chunk on the executor"""
+    response_start = {}
+
+    def start_response(status, headers, exc_info=None):
+        response_start['status'] = int(status.split(' ', 1)[0])
+        response_start['headers'] = [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                                     for name, value in headers]
+        return lambda data: None
+
+    result = await _run(blocking_executor, flask_app, _build_environ(scope, body), start_response)
+    chunks = iter(result)
+    try:
+        chunk = await _run(blocking_executor, next, chunks, None)
+        await send({'type': 'http.response.start', **response_start})
+        while chunk is not None and not disconnected.is_set():
+            if chunk:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            chunk = await _run(blocking_executor, next, chunks, None)
+        await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+    finally:
+        if hasattr(result, 'close'):
+            # Releases stream slots and pinned store files, even after a disconnect
+            await _run(blocking_executor, result.close)
+
+
+def _build_environ(scope, body):
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+        # Tells the Flask app that /download_events is served as an event stream here
+        'clovix.asgi': True,
+    }
+    for name, value in scope.get('headers', []):
+        name, value = name.decode('latin-1'), value.decode('latin-1')
+        if name == 'content-type':
+            key = 'CONTENT_TYPE'
+        elif name == 'content-length':
+            key = 'CONTENT_LENGTH'
+        else:
+            key = 'HTTP_' + name.upper().replace('-', '_')
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+def _parse_json(body):
+    try:
+        data = json.loads(body)
+    except (ValueError, UnicodeDecodeError):
+        return None
+    return data if isinstance(data, dict) else None
+
+
+async def _send_json(send, payload, status, headers):
+    data = json.dumps(payload).encode('utf-8')
+    raw_headers = [(b'content-type', b'application/json'), (b'content-length', str(len(data)).encode())]
+    raw_headers += [(name.lower().encode('latin-1'), str(value).encode('latin-1')) for name, value in headers.items()]
+    await send({'type': 'http.response.start', 'status': status, 'headers': raw_headers})
+    await send({'type': 'http.response.body', 'body': data, 'more_body': False})
+
+
+async def _send_chunk(send, text):
+    await send({'type': 'http.response.body', 'body': text.encode('utf-8'), 'more_body': True})
+
+
+async def _read_body(receive):
+    """Return the full request body, or None if the client disconnected first"""
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return None
+        chunk = message.get('body', b'')
+        size += len(chunk)
+        if size > MAX_BODY_BYTES:
+            raise _BodyTooLarge()
+        chunks.append(chunk)
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+
+async def _watch_disconnect(receive, disconnected):
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            disconnected.set()
+            return
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            # Startup runs in the serving process, so jobs resume where their progress can be read
+            await _run(blocking_executor, resume_orphaned_downloads)
+            logging.info("ASGI app started")
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            extract_executor.shutdown(wait=False)
+            blocking_executor.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
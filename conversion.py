@@ -0,0 +1,286 @@
+import os
+import re
+import heapq
+import logging
+import itertools
+import threading
+import subprocess
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+_DURATION_RE = re.compile(r'Duration:\s*(\d+):(\d+):(\d+(?:\.\d+)?)')
+
+
+class ConversionExecutor:
+    """Bounded pool of ffmpeg jobs with a priority queue, per-job timeouts and progress
+
+    Each slot is a thread supervising one ffmpeg process, so the number of slots times
+    the threads given to each job stays within the machine's cores. Piped jobs spend
+    most of their time waiting on the download that feeds them, so they queue for a
+    separate set of pipe slots and never hold up file conversions.
+    """
+
+    def __init__(self, max_jobs=None, threads_per_job=None, timeout=None, ffmpeg=None, max_pipes=None):
+        cpus = os.cpu_count() or 1
+        self.max_jobs = max_jobs or int(os.environ.get('CONVERSION_SLOTS', max(1, cpus // 2)))
+        self.max_pipes = max_pipes or int(os.environ.get('CONVERSION_PIPE_SLOTS', 4))
+        self.threads_per_job = threads_per_job or int(os.environ.get('CONVERSION_THREADS', max(1, cpus // self.max_jobs)))
+        self.timeout = timeout or int(os.environ.get('CONVERSION_TIMEOUT', 1800))
+        self.ffmpeg = ffmpeg or os.environ.get('FFMPEG_PATH', 'ffmpeg')
+
+        self._heap = []
+        self._pipe_heap = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self.running = 0
+        self.running_pipes = 0
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+        # Process that owns the slot threads; threads do not survive a fork
+        self._pid = None
+
+    def submit(self, input_args, output_args, output_path, priority=0, duration=None, on_progress=None, timeout=None,
+               source_cmd=None, deadline=None):
+        """Queue one ffmpeg run; the returned Future resolves to {'file_path': ...} or {'error': ...}
+
+        input_args go before the output options (typically ['-i', path]) and output_args
+        hold codec and container options. on_progress(percent) is called as ffmpeg reports
+        its position, using duration (seconds) when known or the duration ffmpeg prints.
+        With source_cmd, that command is started when the job gets a pipe slot and its
+        stdout feeds ffmpeg's stdin (use ['-i', 'pipe:0']), so both run as one pipeline.
+        A deadline caps the timeout to what is left of it when the job gets a slot.
+        """
+        future = Future()
+        job = {
+            'input_args': list(input_args),
+            'output_args': list(output_args),
+            'output_path': output_path,
+            'duration': duration,
+            'on_progress': on_progress,
+            'timeout': timeout or self.timeout,
+            'source_cmd': source_cmd,
+            'deadline': deadline,
+            'future': future,
+        }
+        with self._cond:
+            self._start_workers()
+            heapq.heappush(self._pipe_heap if source_cmd else self._heap, (priority, next(self._counter), job))
+            # Slots of both kinds wait on the same condition
+            self._cond.notify_all()
+        return future
+
+    def convert(self, input_args, output_args, output_path, deadline=None, **kwargs):
+        """Run a conversion through the queue and wait for its result, no longer than the deadline allows"""
+        future = self.submit(input_args, output_args, output_path, deadline=deadline, **kwargs)
+        try:
+            return future.result(timeout=deadline.remaining() if deadline else None)
+        except FutureTimeout:
+            # A running job is already bounded by the deadline; one still queued is dropped
+            if not future.cancel():
+                return future.result()
+            with self._cond:
+                self.timeouts += 1
+            logging.warning(f"Conversion of {output_path} timed out while queued")
+            return {'error': 'Conversion skipped: time limit reached', 'timed_out': True}
+
+    def stats(self):
+        with self._cond:
+            return {
+                'slots': self.max_jobs,
+                'pipe_slots': self.max_pipes,
+                'threads_per_job': self.threads_per_job,
+                'running': self.running,
+                'queued': len(self._heap),
+                'running_pipes': self.running_pipes,
+                'queued_pipes': len(self._pipe_heap),
+                'completed': self.completed,
+                'failed': self.failed,
+                'timeouts': self.timeouts,
+            }
+
+    def _start_workers(self):
+        # Slot threads are per process; a worker forked by gunicorn --preload starts its own on first submit
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        for i in range(self.max_jobs):
+            threading.Thread(target=self._worker_loop, args=(False,), name=f"conversion-{i}", daemon=True).start()
+        for i in range(self.max_pipes):
+            threading.Thread(target=self._worker_loop, args=(True,), name=f"conversion-pipe-{i}", daemon=True).start()
+        logging.info(f"ConversionExecutor started with {self.max_jobs} slots, {self.max_pipes} pipe slots, "
+                     f"{self.threads_per_job} threads per job")
+
+    def _reset_after_fork(self):
+        # Queued conversions stay with the parent's slots, and a lock held mid-fork would never be released here
+        self._cond = threading.Condition()
+        self._heap = []
+        self._pipe_heap = []
+        self.running = 0
+        self.running_pipes = 0
+        self._pid = None
+
+    def _worker_loop(self, piped):
+        while True:
+            with self._cond:
+                while not (self._pipe_heap if piped else self._heap):
+                    self._cond.wait()
+                _, _, job = heapq.heappop(self._pipe_heap if piped else self._heap)
+                self._count_running(piped, 1)
+
+            future = job['future']
+            if not future.set_running_or_notify_cancel():
+                with self._cond:
+                    self._count_running(piped, -1)
+                continue
+
+            try:
+                result = self._run(job)
+            except Exception as e:
+                logging.error(f"Conversion crashed: {str(e)}", exc_info=True)
+                result = {'error': f'Conversion failed: {str(e)}'}
+
+            with self._cond:
+                self._count_running(piped, -1)
+                if 'error' in result:
+                    self.failed += 1
+                else:
+                    self.completed += 1
+            future.set_result(result)
+
+    def _count_running(self, piped, delta):
+        # Called with self._cond held
+        if piped:
+            self.running_pipes += delta
+        else:
+            self.running += delta
+
+    def _run(self, job):
+        timeout = job['timeout']
+        remaining = job['deadline'].remaining() if job['deadline'] else None
+        if remaining is not None:
+            if remaining <= 0:
+                # The request gave up while this job was queued
+                return {'error': 'Conversion skipped: time limit reached', 'timed_out': True}
+            timeout = min(timeout, remaining)
+        
+        cmd = ([self.ffmpeg, '-hide_banner', '-nostdin', '-nostats', '-y'] + job['input_args'] +
+               ['-threads', str(self.threads_per_job)] + job['output_args'] +
+               ['-progress', 'pipe:1', job['output_path']])
+        logging.info(f"Running conversion: {' '.join(cmd)}")
+
+        source = None
+        try:
+            if job['source_cmd']:
+                source = subprocess.Popen(job['source_cmd'], stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                          stdin=subprocess.DEVNULL)
+            process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                       stdin=source.stdout if source else subprocess.DEVNULL,
+                                       text=True, errors='replace')
+        except OSError as e:
+            if source:
+                source.kill()
+                source.wait()
+            return {'error': f'ffmpeg unavailable: {str(e)}'}
+        if source:
+            # ffmpeg holds the read end now; closing ours lets the source see a broken pipe if ffmpeg dies
+            source.stdout.close()
+
+        # stderr must be drained concurrently or a chatty process blocks on a full pipe
+        stderr_tail = deque(maxlen=40)
+        source_tail = deque(maxlen=10)
+        duration = {'seconds': job['duration']}
+
+        def read_stderr():
+            for line in process.stderr:
+                stderr_tail.append(line.rstrip())
+                if not duration['seconds']:
+                    match = _DURATION_RE.search(line)
+                    if match:
+                        hours, minutes, seconds = match.groups()
+                        duration['seconds'] = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+        def read_source_stderr():
+            for line in source.stderr:
+                source_tail.append(line.decode('utf-8', 'replace').rstrip())
+
+        readers = [threading.Thread(target=read_stderr, daemon=True)]
+        if source:
+            readers.append(threading.Thread(target=read_source_stderr, daemon=True))
+        for reader in readers:
+            reader.start()
+
+        timed_out = threading.Event()
+
+        def kill():
+            timed_out.set()
+            process.kill()
+            if source:
+                source.kill()
+
+        timer = threading.Timer(timeout, kill)
+        timer.daemon = True
+        timer.start()
+        try:
+            self._read_progress(process.stdout, duration, job['on_progress'])
+            returncode = process.wait()
+            source_returncode = source.wait() if source else 0
+        finally:
+            timer.cancel()
+            for reader in readers:
+                reader.join(timeout=5)
+
+        if timed_out.is_set():
+            with self._cond:
+                self.timeouts += 1
+            self._discard(job['output_path'])
+            logging.error(f"Conversion timed out after {timeout:.0f}s: {job['output_path']}")
+            return {'error': f"Conversion timed out after {timeout:.0f} seconds", 'timed_out': True}
+
+        if returncode != 0 or not os.path.exists(job['output_path']):
+            self._discard(job['output_path'])
+            logging.error(f"ffmpeg exited with {returncode}: {' / '.join(list(stderr_tail)[-5:])}")
+            return {'error': f'Conversion failed (ffmpeg exit code {returncode})'}
+
+        # ffmpeg treats a source that died mid-download as a normal end of input
+        if source_returncode != 0:
+            self._discard(job['output_path'])
+            logging.error(f"Conversion source exited with {source_returncode}: {' / '.join(source_tail)}")
+            return {'error': f'Download for conversion failed (exit code {source_returncode})'}
+
+        return {'file_path': job['output_path']}
+
+    def _read_progress(self, stdout, duration, on_progress):
+        """Parse ffmpeg's -progress key=value stream and report whole-percent steps"""
+        last_percent = None
+        for line in stdout:
+            key, _, value = line.strip().partition('=')
+            if key == 'out_time_us' or key == 'out_time_ms':
+                # Both keys carry microseconds
+                if not on_progress or not duration['seconds'] or not value.isdigit():
+                    continue
+                percent = min(99.0, int(value) / 1e6 / duration['seconds'] * 100)
+            elif key == 'progress' and value == 'end':
+                percent = 100.0
+            else:
+                continue
+
+            if on_progress and int(percent) != last_percent:
+                last_percent = int(percent)
+                try:
+                    on_progress(round(percent, 1))
+                except Exception as e:
+                    logging.warning(f"Conversion progress callback failed: {str(e)}")
+
+    def _discard(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+# One executor per process, so CONVERSION_SLOTS bounds the ffmpeg runs of all its downloads together
+conversion_executor = ConversionExecutor()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=conversion_executor._reset_after_fork)
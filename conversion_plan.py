@@ -0,0 +1,218 @@
+import os
+import json
+import logging
+import subprocess
+
+# Codecs each container can carry without re-encoding; None means anything goes
+CONTAINER_CODECS = {
+    'mp4': {'video': {'h264', 'hevc', 'av1', 'vp9', 'mpeg4'}, 'audio': {'aac', 'mp3', 'opus', 'ac3', 'flac', 'alac'}},
+    'mkv': {'video': None, 'audio': None},
+    'webm': {'video': {'vp8', 'vp9', 'av1'}, 'audio': {'opus', 'vorbis'}},
+    'avi': {'video': {'h264', 'mpeg4', 'mjpeg'}, 'audio': {'mp3', 'ac3', 'pcm'}},
+    'flv': {'video': {'h264', 'flv1'}, 'audio': {'aac', 'mp3'}},
+    '3gp': {'video': {'h264', 'h263', 'mpeg4'}, 'audio': {'aac', 'amr_nb', 'amr_wb'}},
+}
+
+# Encoder used when a stream has to be transcoded for a container
+TRANSCODE_ARGS = {
+    'mp4': {'video': ['-c:v', 'libx264', '-preset', 'veryfast'], 'audio': ['-c:a', 'aac']},
+    'mkv': {'video': ['-c:v', 'libx264', '-preset', 'veryfast'], 'audio': ['-c:a', 'aac']},
+    'webm': {'video': ['-c:v', 'libvpx-vp9', '-deadline', 'realtime', '-cpu-used', '8'], 'audio': ['-c:a', 'libopus']},
+    'avi': {'video': ['-c:v', 'mpeg4', '-q:v', '3'], 'audio': ['-c:a', 'libmp3lame']},
+    'flv': {'video': ['-c:v', 'libx264', '-preset', 'veryfast'], 'audio': ['-c:a', 'aac']},
+    '3gp': {'video': ['-c:v', 'libx264', '-preset', 'veryfast'], 'audio': ['-c:a', 'aac']},
+}
+
+# Muxer names where ffmpeg cannot infer the container from the extension
+MUXERS = {'3gp': '3gp', 'mkv': 'matroska'}
+
+# Queue priority per plan kind: cheap remuxes first, full re-encodes last
+PLAN_PRIORITY = {'remux': 0, 'audio_transcode': 1, 'video_transcode': 2, 'transcode': 2}
+
+_CODEC_PREFIXES = (
+    ('avc', 'h264'), ('h264', 'h264'), ('hev', 'hevc'), ('hvc', 'hevc'), ('h265', 'hevc'), ('hevc', 'hevc'),
+    ('vp09', 'vp9'), ('vp9', 'vp9'), ('vp8', 'vp8'), ('av01', 'av1'), ('av1', 'av1'),
+    ('mp4v', 'mpeg4'), ('mpeg4', 'mpeg4'), ('h263', 'h263'), ('flv1', 'flv1'), ('mjpeg', 'mjpeg'),
+    ('mp4a.40.34', 'mp3'), ('mp4a', 'aac'), ('aac', 'aac'), ('opus', 'opus'), ('vorbis', 'vorbis'),
+    ('mp3', 'mp3'), ('ac-3', 'ac3'), ('ac3', 'ac3'), ('flac', 'flac'), ('alac', 'alac'),
+    ('amr_nb', 'amr_nb'), ('samr', 'amr_nb'), ('amr_wb', 'amr_wb'), ('sawb', 'amr_wb'), ('pcm', 'pcm'),
+)
+
+
+def normalize_codec(codec):
+    """Map yt-dlp codec strings (avc1.64001F, mp4a.40.2) and ffprobe names to one family name"""
+    if not codec or codec == 'none':
+        return None
+    codec = codec.lower()
+    for prefix, family in _CODEC_PREFIXES:
+        if codec.startswith(prefix):
+            return family
+    return codec.split('.')[0]
+
+
+def is_legal(container, kind, codec):
+    allowed = CONTAINER_CODECS.get(container, {}).get(kind, set())
+    return codec is not None and (allowed is None or codec in allowed)
+
+
+def probe_streams(path, info_dict=None, format_id=None, timeout=30):
+    """Return {'video': codec, 'audio': codec} for a downloaded file
+
+    ffprobe is authoritative; when it is missing or fails, the codecs yt-dlp reported
+    for the downloaded format are used instead. Streams the file does not have are left
+    out and streams whose codec is unknown map to None.
+    """
+    try:
+        result = subprocess.run(
+            [os.environ.get('FFPROBE_PATH', 'ffprobe'), '-v', 'error', '-show_entries',
+             'stream=codec_type,codec_name', '-of', 'json', path],
+            capture_output=True, text=True, timeout=timeout
+        )
+        if result.returncode == 0:
+            streams = {}
+            for stream in json.loads(result.stdout).get('streams', []):
+                kind = stream.get('codec_type')
+                # The first stream of each kind is the one ffmpeg maps by default
+                if kind in ['video', 'audio'] and kind not in streams:
+                    streams[kind] = normalize_codec(stream.get('codec_name'))
+            return streams
+    except (OSError, ValueError, subprocess.TimeoutExpired) as e:
+        logging.info(f"ffprobe unavailable for {path}, using format metadata: {str(e)}")
+
+    return streams_from_info(info_dict, format_id)
+
+
+def streams_from_info(info_dict, format_id=None):
+    """Codecs yt-dlp reported for format_id, or for the format(s) it selected by default"""
+    if not info_dict:
+        return {'video': None, 'audio': None}
+    formats = []
+    if format_id:
+        formats = [fmt for fmt in info_dict.get('formats') or [] if fmt.get('format_id') == format_id]
+    if not formats:
+        # A merged download lists its parts in requested_formats
+        formats = info_dict.get('requested_formats') or []
+    if not formats:
+        formats = [info_dict]
+    streams = {}
+    for fmt in formats:
+        for kind, key in (('video', 'vcodec'), ('audio', 'acodec')):
+            # 'none' means the format has no such stream; a missing key means unknown
+            if fmt.get(key) != 'none' and streams.get(kind) is None:
+                streams[kind] = normalize_codec(fmt.get(key))
+    return streams
+
+
+def plan_conversion(streams, container):
+    """Decide copy or transcode per stream; returns {'kind', 'args', 'priority'}
+
+    Streams with an unknown codec are transcoded, since copying them is a guess.
+    """
+    args = []
+    transcoded = []
+    for kind, flag in (('video', '-c:v'), ('audio', '-c:a')):
+        if kind not in streams:
+            continue
+        if is_legal(container, kind, streams[kind]):
+            args += [flag, 'copy']
+        else:
+            args += TRANSCODE_ARGS.get(container, TRANSCODE_ARGS['mp4'])[kind]
+            transcoded.append(kind)
+
+    if not transcoded:
+        plan_kind = 'remux'
+    elif transcoded == ['audio']:
+        plan_kind = 'audio_transcode'
+    elif transcoded == ['video']:
+        plan_kind = 'video_transcode'
+    else:
+        plan_kind = 'transcode'
+
+    if container in MUXERS:
+        args += ['-f', MUXERS[container]]
+    return {'kind': plan_kind, 'args': args, 'priority': PLAN_PRIORITY[plan_kind]}
+
+
+def full_transcode_plan(container):
+    """Plan used when a copy plan turns out not to work for the actual file"""
+    return plan_conversion({'video': None, 'audio': None}, container)
+
+
+def _has_video_and_audio(fmt):
+    # Same test as yt-dlp's "best" selector: an unknown codec counts as present
+    return fmt.get('vcodec') != 'none' and fmt.get('acodec') != 'none'
+
+
+def pick_native_format(info_dict, container, format_id=None, max_height=1080):
+    """Pick a format selector that yields container directly, so no conversion is needed
+
+    Prefers a single progressive file in the container; for webm and mkv a video+audio
+    pair that yt-dlp can merge straight into the container is accepted too. The pick
+    must have the same height as the requested format (or the best single file with
+    audio under max_height), so skipping conversion neither costs quality nor
+    downloads more. Returns None when nothing fits.
+    """
+    formats = (info_dict or {}).get('formats') or []
+    if not formats or container not in CONTAINER_CODECS:
+        return None
+
+    requested_height = None
+    if format_id:
+        requested = next((fmt for fmt in formats if fmt.get('format_id') == format_id), None)
+        if requested and requested.get('height'):
+            max_height = requested_height = requested['height']
+
+    def fits(fmt, kind):
+        return is_legal(container, kind, normalize_codec(fmt.get('vcodec' if kind == 'video' else 'acodec')))
+
+    def height(fmt):
+        return fmt.get('height') or 0
+
+    candidates = [fmt for fmt in formats if height(fmt) <= max_height]
+    # Without a requested format the download is best[height<=max_height], a single file with audio
+    reachable = candidates if requested_height else [fmt for fmt in candidates if _has_video_and_audio(fmt)]
+    target_height = max((height(fmt) for fmt in reachable or candidates), default=0)
+    candidates = [fmt for fmt in candidates if height(fmt) == target_height or fmt.get('vcodec') == 'none']
+
+    progressive = [fmt for fmt in candidates
+                   if fmt.get('ext') == container and fits(fmt, 'video') and fits(fmt, 'audio')]
+    if progressive:
+        best = max(progressive, key=lambda fmt: (height(fmt), fmt.get('tbr') or 0))
+        return {'format': best['format_id'], 'merge': False}
+
+    if container in ['webm', 'mkv']:
+        videos = [fmt for fmt in candidates if fits(fmt, 'video') and fmt.get('acodec') == 'none']
+        audios = [fmt for fmt in formats if fits(fmt, 'audio') and fmt.get('vcodec') == 'none']
+        if videos and audios:
+            video = max(videos, key=lambda fmt: (height(fmt), fmt.get('tbr') or 0))
+            audio = max(audios, key=lambda fmt: fmt.get('abr') or fmt.get('tbr') or 0)
+            return {'format': f"{video['format_id']}+{audio['format_id']}", 'merge': True}
+
+    return None
+
+
+def pick_pipe_format(info_dict, format_id=None, max_height=1080):
+    """Pick a single-file HTTP format that yt-dlp can write to a pipe for on-the-fly conversion
+
+    Merged (video+audio) and fragmented formats cannot be piped. As with native formats,
+    the pick must match the height that would otherwise be downloaded. Returns the format
+    dict or None.
+    """
+    formats = (info_dict or {}).get('formats') or []
+
+    def pipeable(fmt):
+        return (fmt.get('protocol') in ['http', 'https'] and fmt.get('vcodec') != 'none'
+                and fmt.get('acodec') != 'none' and fmt.get('format_id'))
+
+    if format_id:
+        requested = next((fmt for fmt in formats if fmt.get('format_id') == format_id), None)
+        if not requested:
+            return None
+        return requested if pipeable(requested) else None
+
+    candidates = [fmt for fmt in formats if _has_video_and_audio(fmt) and (fmt.get('height') or 0) <= max_height]
+    target_height = max((fmt.get('height') or 0 for fmt in candidates), default=0)
+    pipeable_formats = [fmt for fmt in candidates if pipeable(fmt) and (fmt.get('height') or 0) >= target_height]
+    if not pipeable_formats:
+        return None
+    return max(pipeable_formats, key=lambda fmt: fmt.get('tbr') or 0)
@@ -0,0 +1,44 @@
+import math
+import time
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class Deadline:
+    """Time budget for one request or job, shared by every stage that works on it
+
+    Stages ask for timeout(default) instead of using their own fixed timeouts, so a
+    late stage gets whatever is left rather than its full allowance, and check() fails
+    fast once the budget is gone. Deadline(None) never expires.
+    """
+
+    def __init__(self, seconds=None):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds if seconds else None
+
+    def remaining(self):
+        """Seconds left, or None without a limit"""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
+
+    def check(self, stage):
+        if self.expired():
+            raise DeadlineExceeded(f"Time limit of {self.seconds:g}s reached during {stage}")
+
+    def timeout(self, default, stage='this step'):
+        """default shrunk to the remaining budget, in whole seconds; raises once expired"""
+        self.check(stage)
+        remaining = self.remaining()
+        if remaining is None:
+            return default
+        # Whole seconds keep pooled YoutubeDL option profiles from changing on every call
+        return max(1, min(default, math.ceil(remaining)))
+
+    def message(self, action):
+        return f"{action} took longer than {self.seconds:g} seconds and was stopped. Please try again."
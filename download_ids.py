@@ -0,0 +1,60 @@
+import os
+import time
+import threading
+
+# Crockford base32: no I, L, O or U, so IDs survive being read aloud or retyped
+_ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+_RANDOM_BITS = 80
+
+
+class DownloadIdGenerator:
+    """ULID-style IDs: 48-bit millisecond timestamp plus 80 random bits, 26 characters
+
+    IDs sort by creation time. Within one millisecond the random part is incremented
+    instead of redrawn, so IDs from this process stay unique and ordered; the random
+    bits keep workers and machines from colliding with each other.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last_ms = -1
+        self._last_random = 0
+
+    def new_id(self):
+        with self._lock:
+            now_ms = int(time.time() * 1000)
+            if now_ms <= self._last_ms:
+                # Same millisecond (or the clock stepped back): keep counting from the last ID
+                now_ms = self._last_ms
+                self._last_random += 1
+                if self._last_random >> _RANDOM_BITS:
+                    now_ms += 1
+                    self._last_random = int.from_bytes(os.urandom(10), 'big')
+            else:
+                self._last_random = int.from_bytes(os.urandom(10), 'big')
+            self._last_ms = now_ms
+            value = (now_ms << _RANDOM_BITS) | self._last_random
+
+        chars = []
+        for _ in range(26):
+            chars.append(_ALPHABET[value & 31])
+            value >>= 5
+        return ''.join(reversed(chars))
+
+
+_generator = DownloadIdGenerator()
+
+
+def _reset_after_fork():
+    # A forked worker must not continue the parent's sequence within the same millisecond
+    _generator._lock = threading.Lock()
+    _generator._last_ms = -1
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def new_download_id():
+    """Return a new unique, time-ordered download ID"""
+    return _generator.new_id()
@@ -0,0 +1,189 @@
+import os
+import heapq
+import itertools
+import logging
+import threading
+from contextlib import contextmanager
+
+
+class QueueFullError(Exception):
+    """Raised when the download queue has reached its configured depth"""
+
+
+class DownloadScheduler:
+    """Bounded worker pool with a priority/FIFO job queue for downloads"""
+
+    def __init__(self, max_workers=None, max_queue=None, on_queue_change=None):
+        self.max_workers = max_workers or int(os.environ.get('DOWNLOAD_WORKERS', min(4, os.cpu_count() or 1)))
+        self.max_queue = max_queue if max_queue is not None else int(os.environ.get('DOWNLOAD_QUEUE_SIZE', 50))
+        # Called as on_queue_change(job_id, position) whenever a queued job moves
+        self.on_queue_change = on_queue_change
+
+        self._heap = []
+        self._pending = {}
+        self._counter = itertools.count()
+        self._running = set()
+        # Single-flight: dedupe key -> job_id of the queued or running job
+        self._inflight = {}
+        self._job_keys = {}
+        self.coalesced = 0
+        self._cond = threading.Condition()
+        self._workers = []
+        # Process that owns the worker threads; threads do not survive a fork
+        self._pid = None
+
+    def submit(self, job_id, fn, priority=0, dedupe_key=None):
+        """Queue fn() to run on a worker; lower priority values run first, FIFO within a priority
+
+        When dedupe_key matches a job that is still queued or running, nothing new is
+        queued and that job's id is returned so callers can attach to it.
+        """
+        with self._cond:
+            if dedupe_key is not None and dedupe_key in self._inflight:
+                self.coalesced += 1
+                return self._inflight[dedupe_key]
+
+            if len(self._pending) >= self.max_queue:
+                raise QueueFullError(f"Download queue is full ({self.max_queue} jobs waiting)")
+
+            self._start_workers()
+            entry = (priority, next(self._counter), job_id)
+            self._pending[job_id] = (entry, fn)
+            heapq.heappush(self._heap, entry)
+            if dedupe_key is not None:
+                self._inflight[dedupe_key] = job_id
+                self._job_keys[job_id] = dedupe_key
+            self._cond.notify()
+            positions = self._positions()
+
+        self._publish_positions(positions)
+        return job_id
+
+    def position(self, job_id):
+        """Return the 1-based queue position of a waiting job, 0 if running, None if unknown"""
+        with self._cond:
+            if job_id in self._running:
+                return 0
+            if job_id not in self._pending:
+                return None
+            entry = self._pending[job_id][0]
+            return 1 + sum(1 for other, _ in self._pending.values() if other < entry)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'workers': self.max_workers,
+                'running': len(self._running),
+                'queued': len(self._pending),
+                'queue_limit': self.max_queue,
+                'coalesced': self.coalesced,
+            }
+
+    def _start_workers(self):
+        # Started on first use in each process, so workers forked by gunicorn --preload get their own
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._workers = []
+        for i in range(self.max_workers):
+            worker = threading.Thread(target=self._worker_loop, name=f"download-worker-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+        logging.info(f"DownloadScheduler started with {self.max_workers} workers, queue depth {self.max_queue}")
+
+    def _reset_after_fork(self):
+        # Jobs queued in the parent are run by the parent; the lock may have been held mid-fork
+        self._cond = threading.Condition()
+        self._heap = []
+        self._pending = {}
+        self._running = set()
+        self._inflight = {}
+        self._job_keys = {}
+        self._workers = []
+        self._pid = None
+
+    def _positions(self):
+        ordered = sorted(entry for entry, _ in self._pending.values())
+        return [(entry[2], i + 1) for i, entry in enumerate(ordered)]
+
+    def _publish_positions(self, positions):
+        if not self.on_queue_change:
+            return
+        for job_id, position in positions:
+            try:
+                self.on_queue_change(job_id, position)
+            except Exception as e:
+                logging.warning(f"Queue position callback failed for {job_id}: {str(e)}")
+
+    def _worker_loop(self):
+        while True:
+            with self._cond:
+                while not self._heap:
+                    self._cond.wait()
+                entry = heapq.heappop(self._heap)
+                job_id = entry[2]
+                _, fn = self._pending.pop(job_id)
+                self._running.add(job_id)
+                positions = self._positions()
+
+            self._publish_positions(positions)
+
+            try:
+                fn()
+            except Exception as e:
+                logging.error(f"Download job {job_id} crashed: {str(e)}", exc_info=True)
+            finally:
+                with self._cond:
+                    self._running.discard(job_id)
+                    dedupe_key = self._job_keys.pop(job_id, None)
+                    if dedupe_key is not None:
+                        self._inflight.pop(dedupe_key, None)
+
+
+class ConnectionBudget:
+    """Process-wide cap on parallel fragment connections shared by all running downloads
+
+    Each download leases up to per_job connections, but never more than the budget has
+    left, so one large DASH/HLS download cannot starve the rest. A lease is always at
+    least one connection, so a job is never blocked by the budget.
+    """
+
+    def __init__(self, total=None, per_job=None):
+        self.total = total or int(os.environ.get('DOWNLOAD_CONNECTION_BUDGET', 16))
+        self.per_job = per_job or int(os.environ.get('FRAGMENT_CONCURRENCY', 4))
+        self._in_use = 0
+        self._leases = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def lease(self):
+        """Reserve connections for one download; yields how many it may open"""
+        with self._lock:
+            granted = max(1, min(self.per_job, self.total - self._in_use))
+            self._in_use += granted
+            self._leases += 1
+        try:
+            yield granted
+        finally:
+            with self._lock:
+                self._in_use -= granted
+                self._leases -= 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'total': self.total,
+                'per_job': self.per_job,
+                'in_use': self._in_use,
+                'downloads': self._leases,
+            }
+
+
+# Download jobs of this process; the web app sets on_queue_change to publish queue positions
+download_scheduler = DownloadScheduler()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=download_scheduler._reset_after_fork)
+
+# The budget only caps connections if every download leases from this one instance
+connection_budget = ConnectionBudget()
@@ -0,0 +1,290 @@
+import os
+import sys
+import time
+import socket
+import logging
+import threading
+import subprocess
+from multiprocessing.connection import Connection
+
+
+class PoolUnavailable(Exception):
+    """No worker could run the job; callers fall back to the yt-dlp CLI"""
+
+
+class WorkerTimeout(Exception):
+    pass
+
+
+class WorkerFailed(Exception):
+    """yt-dlp itself reported an error; running the CLI instead would fail the same way"""
+
+
+# Workers are plain interpreters started with this, so they never re-import the web app
+_WORKER_ENTRY = 'import sys, extractor_pool; extractor_pool._worker_main(sys.argv[1])'
+
+
+class _ErrorLog:
+    """yt-dlp logger that keeps error messages to send back instead of printing them"""
+
+    def __init__(self):
+        self.errors = []
+
+    def debug(self, msg):
+        pass
+
+    def info(self, msg):
+        pass
+
+    def warning(self, msg):
+        pass
+
+    def error(self, msg):
+        self.errors.append(msg)
+
+    def last(self, default):
+        return self.errors[-1] if self.errors else default
+
+
+def _worker_main(fd):
+    """Worker loop: run yt-dlp argument lists in-process and send back structured results"""
+    import yt_dlp
+    from yt_dlp.extractor import gen_extractor_classes
+    from output_tracker import OutputTracker
+
+    conn = Connection(int(fd))
+    # Matching a URL compiles every extractor's pattern on first use; do it before the first job
+    for ie in gen_extractor_classes():
+        ie.suitable('https://example.invalid/')
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, OSError):
+            return
+        if job is None:
+            return
+        try:
+            parsed = yt_dlp.parse_options(job['argv'])
+            if len(parsed.urls) != 1:
+                raise ValueError(f"Expected one URL, got {len(parsed.urls)}")
+            log = _ErrorLog()
+            ydl_opts = dict(parsed.ydl_opts, quiet=True, noprogress=True, logger=log)
+
+            if job['op'] == 'download':
+                last_sent = {}
+
+                def forward_progress(d):
+                    # Only status and whole-percent changes cross the pipe
+                    update = {'status': d['status'], '_percent_str': d.get('_percent_str', ''),
+                              'filename': d.get('filename')}
+                    if (update['status'], update['_percent_str'].split('.')[0]) != last_sent.get('key'):
+                        last_sent['key'] = (update['status'], update['_percent_str'].split('.')[0])
+                        conn.send(('progress', update))
+
+                tracker = OutputTracker(forward_progress).install(ydl_opts)
+                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                    ydl.extract_info(parsed.urls[0], download=True)
+                path = tracker.output_path()
+                conn.send(('result', path) if path else ('error', log.last('Download produced no file')))
+            else:
+                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                    info = ydl.extract_info(parsed.urls[0], download=False)
+                    if not info:
+                        raise ValueError(log.last('No video information returned'))
+                    info = ydl.sanitize_info(info)
+                fields = job.get('fields')
+                conn.send(('result', {key: info.get(key) for key in fields} if fields else info))
+        except Exception as e:
+            conn.send(('error', str(e)))
+
+
+class ExtractorPool:
+    """Persistent yt-dlp worker processes that run CLI-style argument lists in-process
+
+    Running the yt-dlp CLI pays interpreter start-up and the full yt-dlp import on every
+    call and returns text to re-parse. Workers here import yt-dlp once, then take jobs
+    over a socket pair and answer with plain dicts, so their extractor and player caches
+    stay warm between jobs. prestart() brings the pool up to size at startup; workers
+    that are retired later are replaced on demand. A worker is used by one caller at a
+    time; one that times out, dies or misbehaves is killed and replaced, and every
+    worker is retired after max_jobs jobs to keep its memory in check. PoolUnavailable
+    tells callers to use the subprocess path instead.
+    """
+
+    def __init__(self, size=None, max_jobs=None, wait=None):
+        self.enabled = os.environ.get('EXTRACTOR_POOL', '1') != '0'
+        self.size = size or int(os.environ.get('EXTRACTOR_POOL_SIZE', 2))
+        self.max_jobs = max_jobs or int(os.environ.get('EXTRACTOR_POOL_MAX_JOBS', 50))
+        # How long a caller waits for a free worker before using the CLI instead
+        self.wait = wait or float(os.environ.get('EXTRACTOR_POOL_WAIT', 5))
+
+        self._idle = []
+        self._total = 0
+        self._cond = threading.Condition()
+        self._prestarted = False
+        self.jobs = 0
+        self.fallbacks = 0
+        self.restarts = 0
+
+    def extract_info(self, argv, fields=None, timeout=60):
+        """Info for the single URL in argv; only the listed fields when given"""
+        return self._call({'op': 'extract', 'argv': list(argv), 'fields': fields}, timeout)
+
+    def download(self, argv, timeout=600, progress_hook=None):
+        """Download the single URL in argv; returns the final file path"""
+        return self._call({'op': 'download', 'argv': list(argv)}, timeout, progress_hook)
+
+    def prestart(self):
+        """Start the pool's workers in the background so the first jobs find yt-dlp already loaded"""
+        if not self.enabled or os.environ.get('EXTRACTOR_POOL_PRESTART', '1') == '0':
+            return
+        self._prestarted = True
+        threading.Thread(target=self._fill, name='extractor-pool-prestart', daemon=True).start()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'enabled': self.enabled,
+                'size': self.size,
+                'workers': self._total,
+                'idle': len(self._idle),
+                'jobs': self.jobs,
+                'fallbacks': self.fallbacks,
+                'restarts': self.restarts,
+            }
+
+    def shutdown(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._total -= len(idle)
+        for worker in idle:
+            self._stop(worker)
+
+    def _call(self, job, timeout, progress_hook=None):
+        worker = self._checkout()
+        healthy = False
+        try:
+            worker['conn'].send(job)
+            expires_at = time.monotonic() + timeout
+            while True:
+                if not worker['conn'].poll(max(0.0, expires_at - time.monotonic())):
+                    raise WorkerTimeout(f"yt-dlp worker gave no result within {timeout}s")
+                kind, payload = worker['conn'].recv()
+                if kind == 'progress':
+                    if progress_hook:
+                        progress_hook(payload)
+                    continue
+                healthy = True
+                if kind == 'error':
+                    raise WorkerFailed(payload)
+                return payload
+        except (EOFError, OSError) as e:
+            with self._cond:
+                self.fallbacks += 1
+            raise PoolUnavailable(f"yt-dlp worker died: {str(e)}")
+        finally:
+            worker['jobs'] += 1
+            self._checkin(worker, healthy)
+
+    def _checkout(self):
+        if not self.enabled:
+            raise PoolUnavailable('Extractor pool is disabled')
+        expires_at = time.monotonic() + self.wait
+        with self._cond:
+            while not self._idle and self._total >= self.size:
+                remaining = expires_at - time.monotonic()
+                if remaining <= 0:
+                    self.fallbacks += 1
+                    raise PoolUnavailable('All yt-dlp workers are busy')
+                self._cond.wait(remaining)
+            if self._idle:
+                self.jobs += 1
+                return self._idle.pop()
+            # Reserve the slot before starting the process outside the lock
+            self._total += 1
+            self.jobs += 1
+
+        try:
+            return self._start_worker()
+        except Exception as e:
+            with self._cond:
+                self._total -= 1
+                self.fallbacks += 1
+                self._cond.notify()
+            logging.error(f"Could not start yt-dlp worker: {str(e)}")
+            raise PoolUnavailable(str(e))
+
+    def _checkin(self, worker, healthy):
+        if healthy and worker['jobs'] < self.max_jobs and worker['process'].poll() is None:
+            with self._cond:
+                self._idle.append(worker)
+                self._cond.notify()
+            return
+        if not healthy:
+            with self._cond:
+                self.restarts += 1
+        with self._cond:
+            self._total -= 1
+            self._cond.notify()
+        self._stop(worker, graceful=healthy)
+
+    def _fill(self):
+        while True:
+            with self._cond:
+                if self._total >= self.size:
+                    return
+                self._total += 1
+            try:
+                worker = self._start_worker()
+            except Exception as e:
+                with self._cond:
+                    self._total -= 1
+                    self._cond.notify()
+                logging.warning(f"Could not prestart yt-dlp workers: {str(e)}")
+                return
+            with self._cond:
+                self._idle.append(worker)
+                self._cond.notify()
+
+    def _start_worker(self):
+        parent_sock, child_sock = socket.socketpair()
+        env = dict(os.environ)
+        # The worker must find this module whatever the web app's working directory is
+        env['PYTHONPATH'] = os.pathsep.join(filter(None, [os.path.dirname(os.path.abspath(__file__)), env.get('PYTHONPATH')]))
+        try:
+            process = subprocess.Popen([sys.executable, '-c', _WORKER_ENTRY, str(child_sock.fileno())],
+                                       pass_fds=(child_sock.fileno(),), stdin=subprocess.DEVNULL, env=env)
+        except Exception:
+            parent_sock.close()
+            raise
+        finally:
+            child_sock.close()
+        logging.info(f"Started yt-dlp worker {process.pid}")
+        return {'process': process, 'conn': Connection(parent_sock.detach()), 'jobs': 0}
+
+    def _stop(self, worker, graceful=True):
+        try:
+            if graceful:
+                worker['conn'].send(None)
+                worker['process'].wait(timeout=1)
+        except (OSError, ValueError, subprocess.TimeoutExpired):
+            pass
+        if worker['process'].poll() is None:
+            worker['process'].kill()
+            worker['process'].wait()
+        worker['conn'].close()
+
+    def _reset_after_fork(self):
+        # Workers and pipes belong to the parent; a forked web worker starts its own
+        self._cond = threading.Condition()
+        self._idle = []
+        self._total = 0
+        if self._prestarted:
+            self.prestart()
+
+
+# Each web worker process owns its own EXTRACTOR_POOL_SIZE yt-dlp workers
+extractor_pool = ExtractorPool()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=extractor_pool._reset_after_fork)
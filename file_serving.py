@@ -0,0 +1,163 @@
+import os
+import logging
+import mimetypes
+import unicodedata
+from urllib.parse import quote
+from datetime import datetime, timezone
+from flask import Response
+from werkzeug.http import (http_date, is_resource_modified, parse_date, parse_etags, parse_if_range_header,
+                           parse_range_header, quote_etag)
+
+CHUNK_SIZE = 256 * 1024
+
+# Opt-in hand-off of file transfers to the front proxy: 'x-accel-redirect' (nginx) or 'x-sendfile'
+FILE_OFFLOAD = os.environ.get('FILE_OFFLOAD', '').lower()
+# nginx internal location that maps onto the file store directory
+FILE_OFFLOAD_PREFIX = '/' + os.environ.get('FILE_OFFLOAD_PREFIX', '/_clovix_files/').strip('/') + '/'
+
+
+def file_response(environ, path, download_name, opener=open):
+    """Serve a finished file with HEAD, conditional GET and single byte-range support
+
+    The file is only opened (through opener, which must return a binary file object the
+    response may close) when a body is actually sent. Validators are the file's mtime
+    and size. A Range that lists more than one range is rejected with 416 rather than
+    answered with a multipart body. Under gunicorn the file is handed to
+    wsgi.file_wrapper already positioned at the range start, so it goes out through
+    sendfile() bounded by Content-Length without passing through Python.
+    """
+    stat = os.stat(path)
+    size = stat.st_size
+    etag = f"{stat.st_mtime_ns:x}-{size:x}"
+    # HTTP dates have whole-second resolution
+    last_modified = datetime.fromtimestamp(int(stat.st_mtime), tz=timezone.utc)
+
+    headers = {
+        'ETag': quote_etag(etag),
+        'Last-Modified': http_date(last_modified),
+        'Accept-Ranges': 'bytes',
+        'Cache-Control': 'no-cache',
+    }
+    mimetype = mimetypes.guess_type(download_name)[0] or 'application/octet-stream'
+
+    if not _preconditions_met(environ, etag, last_modified):
+        return _empty_response(412, headers)
+
+    if not is_resource_modified(environ, etag=etag, last_modified=last_modified):
+        return _empty_response(304, headers)
+
+    status, start, stop = 200, 0, size
+    range_header = environ.get('HTTP_RANGE')
+    if range_header and _if_range_matches(environ, etag, last_modified):
+        byte_range = parse_range_header(range_header)
+        # Malformed ranges and other units are ignored and the whole file is sent
+        if byte_range and byte_range.units == 'bytes':
+            span = byte_range.range_for_length(size) if len(byte_range.ranges) == 1 else None
+            if span is None:
+                headers['Content-Range'] = f"bytes */{size}"
+                return _empty_response(416, headers)
+            status, (start, stop) = 206, span
+            headers['Content-Range'] = f"bytes {start}-{stop - 1}/{size}"
+
+    headers['Content-Length'] = str(stop - start)
+    if environ['REQUEST_METHOD'] == 'HEAD':
+        response = Response(status=status, headers=headers, mimetype=mimetype)
+    else:
+        file = opener(path)
+        try:
+            file.seek(start)
+            response = Response(_body(environ, file, stop - start, stop == size), status=status, headers=headers,
+                                mimetype=mimetype, direct_passthrough=True)
+        except Exception:
+            file.close()
+            raise
+        response.call_on_close(file.close)
+
+    set_disposition(response, download_name)
+    # Response recomputes Content-Length only for bodies it buffers; keep the range length
+    response.headers['Content-Length'] = str(stop - start)
+    return response
+
+
+def offload_response(path, download_name, root):
+    """Let the front proxy send a file under root; returns None when offload is off or the file is elsewhere
+
+    The proxy serves the body itself, including ranges and validators, so the worker is
+    released as soon as these headers are out. nginx opens the file right away and keeps
+    its descriptor, so store eviction during the transfer does not cut it short.
+    """
+    if FILE_OFFLOAD not in ['x-accel-redirect', 'x-sendfile']:
+        return None
+    real_path, real_root = os.path.realpath(path), os.path.realpath(root)
+    if os.path.commonpath([real_path, real_root]) != real_root:
+        logging.info(f"Not offloading {path}: outside {root}")
+        return None
+
+    response = Response(mimetype=mimetypes.guess_type(download_name)[0] or 'application/octet-stream')
+    if FILE_OFFLOAD == 'x-accel-redirect':
+        response.headers['X-Accel-Redirect'] = FILE_OFFLOAD_PREFIX + quote(os.path.relpath(real_path, real_root))
+    else:
+        try:
+            real_path.encode('latin-1')
+        except UnicodeEncodeError:
+            # Header values are latin-1; let Python serve paths that cannot be expressed
+            return None
+        response.headers['X-Sendfile'] = real_path
+    set_disposition(response, download_name)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def set_disposition(response, download_name):
+    """Mark response as an attachment named download_name, whatever characters the name holds"""
+    # Same encoding send_file uses: an ASCII fallback plus an RFC 5987 filename* for other names
+    try:
+        download_name.encode('ascii')
+        names = {'filename': download_name}
+    except UnicodeEncodeError:
+        simple = unicodedata.normalize('NFKD', download_name).encode('ascii', 'ignore').decode('ascii')
+        names = {'filename': simple, 'filename*': f"UTF-8''{quote(download_name, safe='!#$&+-.^_`|~')}"}
+    response.headers.set('Content-Disposition', 'attachment', **names)
+
+
+def _body(environ, file, length, to_end):
+    file_wrapper = environ.get('wsgi.file_wrapper')
+    # gunicorn's wrapper sends exactly Content-Length bytes from the current offset; other
+    # wrappers read to EOF, which is only right when the range runs to the end of the file
+    if file_wrapper and (to_end or environ.get('SERVER_SOFTWARE', '').startswith('gunicorn')):
+        return file_wrapper(file, CHUNK_SIZE)
+    return _read_span(file, length)
+
+
+def _read_span(file, length):
+    while length > 0:
+        chunk = file.read(min(CHUNK_SIZE, length))
+        if not chunk:
+            break
+        length -= len(chunk)
+        yield chunk
+
+
+def _preconditions_met(environ, etag, last_modified):
+    if_match = environ.get('HTTP_IF_MATCH')
+    if if_match:
+        return parse_etags(if_match).contains(etag)
+    if_unmodified_since = parse_date(environ.get('HTTP_IF_UNMODIFIED_SINCE'))
+    return if_unmodified_since is None or last_modified <= if_unmodified_since
+
+
+def _if_range_matches(environ, etag, last_modified):
+    """A Range is honoured only if If-Range (when sent) still describes this file"""
+    if_range = parse_if_range_header(environ.get('HTTP_IF_RANGE'))
+    if if_range.etag is not None:
+        return if_range.etag == etag
+    if if_range.date is not None:
+        return if_range.date == last_modified
+    return True
+
+
+def _empty_response(status, headers):
+    response = Response(status=status, headers=headers)
+    if status != 304:
+        response.headers['Content-Length'] = '0'
+    return response
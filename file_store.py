@@ -0,0 +1,252 @@
+import io
+import os
+import json
+import fcntl
+import shutil
+import hashlib
+import logging
+import tempfile
+import threading
+
+
+class FileStore:
+    """Content-addressed store of finished downloads with a byte quota and LRU eviction
+
+    Each entry lives in its own directory named after the hash of its key, so the
+    original filename is kept for Content-Disposition and lookups never scan the store.
+    The quota covers the whole directory, whichever worker process stored the files:
+    eviction measures usage on disk under an flock, and an entry directory's mtime
+    records when it was last used. A worker only knows about its own pinned files, but
+    a file another worker is still sending stays readable after it is unlinked.
+    """
+
+    def __init__(self, root=None, quota_bytes=None):
+        self.root = root or os.environ.get('FILE_STORE_DIR') or os.path.join(tempfile.gettempdir(), 'clovix_files')
+        self.quota_bytes = quota_bytes or int(os.environ.get('FILE_STORE_QUOTA_MB', 2048)) * 1024 * 1024
+
+        self._entries = {}  # digest -> path of entries this process has seen
+        self._readers = {}  # digest -> number of responses currently streaming the file
+        self._total_bytes = 0  # store usage measured at the last eviction pass
+        self._evict_deferred = False
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        os.makedirs(self.root, exist_ok=True)
+        self._load()
+
+    def key(self, video_id, format_id, file_format, audio_only):
+        """Digest identifying one rendition of a video"""
+        raw = json.dumps([video_id, format_id, file_format, bool(audio_only)])
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def lookup(self, digest):
+        """Return the stored file path for digest, or None"""
+        with self._lock:
+            path = self._entries.get(digest)
+            if not path or not os.path.exists(path):
+                self._entries.pop(digest, None)
+                path = self._adopt(digest)
+            if path is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+
+        self._touch(path)
+        return path
+
+    def add(self, digest, src_path):
+        """Move a finished file into the store and return its new path (None on failure)"""
+        entry_dir = os.path.join(self.root, digest)
+        dest_path = os.path.join(entry_dir, os.path.basename(src_path))
+        try:
+            os.makedirs(entry_dir, exist_ok=True)
+            shutil.move(src_path, dest_path)
+            size = os.path.getsize(dest_path)
+        except Exception as e:
+            logging.error(f"Could not store {src_path}: {str(e)}")
+            return None
+
+        with self._lock:
+            old_path = self._entries.get(digest)
+            if old_path and old_path != dest_path:
+                try:
+                    os.remove(old_path)
+                except OSError:
+                    pass
+            self._entries[digest] = dest_path
+        self._touch(dest_path)
+        self._evict(keep=digest)
+
+        logging.info(f"Stored {os.path.basename(dest_path)} ({size} bytes) in file store")
+        return dest_path
+
+    def acquire(self, path):
+        """Pin a stored file while it is being sent to a client"""
+        digest = self._digest_for(path)
+        if digest:
+            with self._lock:
+                self._readers[digest] = self._readers.get(digest, 0) + 1
+
+    def release(self, path):
+        """Unpin a stored file and evict anything that was held back by the pin"""
+        digest = self._digest_for(path)
+        if not digest:
+            return
+        with self._lock:
+            count = self._readers.get(digest, 0) - 1
+            if count > 0:
+                self._readers[digest] = count
+            else:
+                self._readers.pop(digest, None)
+            deferred = self._evict_deferred
+        if deferred:
+            self._evict()
+
+    def open_pinned(self, path):
+        """Open a stored file for sending; it stays pinned until the file is closed"""
+        self.acquire(path)
+        try:
+            return _PinnedFile(path, lambda: self.release(path))
+        except Exception:
+            self.release(path)
+            raise
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._total_bytes,
+                'quota_bytes': self.quota_bytes,
+                'streaming': sum(self._readers.values()),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+    def _digest_for(self, path):
+        entry_dir = os.path.dirname(os.path.abspath(path))
+        if os.path.dirname(entry_dir) != os.path.abspath(self.root):
+            return None
+        return os.path.basename(entry_dir)
+
+    def _load(self):
+        """Index what is already on disk so stored files survive restarts"""
+        found = self._scan()
+        with self._lock:
+            for _, digest, path, _ in found:
+                self._entries[digest] = path
+        for digest in set(os.listdir(self.root)) - {digest for _, digest, _, _ in found}:
+            entry_dir = os.path.join(self.root, digest)
+            if os.path.isdir(entry_dir):
+                shutil.rmtree(entry_dir, ignore_errors=True)
+        self._evict()
+
+        if found:
+            logging.info(f"File store loaded {len(found)} files ({self._total_bytes} bytes) from {self.root}")
+
+    def _scan(self):
+        """(last used, digest, path, size) for every entry on disk, least recently used first"""
+        found = []
+        for digest in os.listdir(self.root):
+            entry_dir = os.path.join(self.root, digest)
+            try:
+                names = os.listdir(entry_dir)
+                used = os.stat(entry_dir).st_mtime
+            except OSError:
+                # Lock files, or an entry removed by another worker meanwhile
+                continue
+            for name in names:
+                path = os.path.join(entry_dir, name)
+                try:
+                    if os.path.isfile(path):
+                        found.append((used, digest, path, os.path.getsize(path)))
+                        break
+                except OSError:
+                    continue
+        return sorted(found)
+
+    def _adopt(self, digest):
+        """Index an entry another worker process stored after this one loaded the store"""
+        entry_dir = os.path.join(self.root, digest)
+        try:
+            names = os.listdir(entry_dir)
+        except OSError:
+            return None
+        for name in names:
+            path = os.path.join(entry_dir, name)
+            if os.path.isfile(path):
+                self._entries[digest] = path
+                return path
+        return None
+
+    def _touch(self, path):
+        # The entry directory carries the LRU time, so the file keeps its mtime and ETag
+        try:
+            os.utime(os.path.dirname(path))
+        except OSError:
+            pass
+
+    def _evict(self, keep=None):
+        """Drop least recently used files until the store is under quota, skipping pinned ones"""
+        with _StoreLock(os.path.join(self.root, '.evict.lock')):
+            found = self._scan()
+            total = sum(size for _, _, _, size in found)
+            deferred = False
+            for _, digest, path, size in found:
+                if total <= self.quota_bytes:
+                    break
+                with self._lock:
+                    pinned = digest == keep or self._readers.get(digest)
+                    if not pinned:
+                        self._entries.pop(digest, None)
+                if pinned:
+                    deferred = True
+                    continue
+                shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+                total -= size
+                with self._lock:
+                    self.evictions += 1
+                logging.info(f"Evicted {os.path.basename(path)} from file store")
+
+        with self._lock:
+            self._total_bytes = total
+            self._evict_deferred = deferred and total > self.quota_bytes
+
+
+class _StoreLock:
+    """Blocking flock that serialises eviction between worker processes"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.path, 'a')
+        fcntl.flock(self._file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc_info):
+        self._file.close()
+        return False
+
+
+class _PinnedFile(io.BufferedReader):
+    """Read-only file that unpins its store entry when the server closes it"""
+
+    def __init__(self, path, on_close):
+        super().__init__(io.FileIO(path, 'rb'))
+        self._on_close = on_close
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            super().close()
+        finally:
+            self._on_close()
+
+
+# The store directory is shared between worker processes; pins and the path index are per process
+file_store = FileStore()
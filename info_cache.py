@@ -0,0 +1,203 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import secrets
+import threading
+from collections import OrderedDict
+
+
+class InfoCache:
+    """LRU/TTL cache for processed video info, with an optional on-disk backend"""
+
+    def __init__(self, max_entries=None, ttl=None, cache_dir=None):
+        self.max_entries = max_entries or int(os.environ.get('INFO_CACHE_SIZE', 256))
+        self.ttl = ttl or int(os.environ.get('INFO_CACHE_TTL', 600))
+        self.cache_dir = cache_dir if cache_dir is not None else os.environ.get('INFO_CACHE_DIR')
+        self.max_disk_entries = self.max_entries * 4
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+
+        if self.cache_dir:
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                logging.info(f"Info cache persisting to {self.cache_dir}")
+            except OSError as e:
+                logging.error(f"Info cache directory unavailable, using memory only: {str(e)}")
+                self.cache_dir = None
+
+    def get(self, key):
+        """Return a copy of the cached info for key, or None if missing or expired"""
+        if not key:
+            return None
+
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and now - entry[0] < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return dict(entry[1])
+            if entry:
+                del self._entries[key]
+
+        value = self._disk_get(key, now)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.disk_hits += 1
+            self._remember(key, value, now)
+        return dict(value)
+
+    def put(self, key, value):
+        """Cache a successfully processed info dict"""
+        if not key or not value or 'error' in value:
+            return
+
+        now = time.time()
+        with self._lock:
+            self._remember(key, dict(value), now)
+        self._disk_put(key, value, now)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'disk_hits': self.disk_hits,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'disk': bool(self.cache_dir),
+            }
+
+    def _remember(self, key, value, stored_at):
+        self._entries[key] = (stored_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _disk_path(self, key):
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f"{digest}.json")
+
+    def _disk_get(self, key, now):
+        if not self.cache_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, 'r') as f:
+                record = json.load(f)
+            if record.get('key') == key and now - record.get('stored_at', 0) < self.ttl:
+                return record['value']
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logging.warning(f"Info cache read failed for {key}: {str(e)}")
+        return None
+
+    def _disk_put(self, key, value, now):
+        if not self.cache_dir:
+            return
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump({'key': key, 'stored_at': now, 'value': value}, f)
+            # Atomic replace so concurrent readers never see a partial file
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logging.warning(f"Info cache write failed for {key}: {str(e)}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+
+        with self._lock:
+            self._disk_writes += 1
+            prune = self._disk_writes % 32 == 0
+        if prune:
+            self._prune_disk(now)
+
+    def _prune_disk(self, now):
+        """Drop expired files and the oldest ones beyond the disk entry limit"""
+        try:
+            files = []
+            for name in os.listdir(self.cache_dir):
+                if not name.endswith('.json'):
+                    continue
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    files.append((os.path.getmtime(path), path))
+                except OSError:
+                    continue
+            files.sort(reverse=True)
+            for i, (mtime, path) in enumerate(files):
+                if i >= self.max_disk_entries or now - mtime >= self.ttl:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+        except Exception as e:
+            logging.warning(f"Info cache prune failed: {str(e)}")
+
+
+class InfoDictStore:
+    """Short-lived store of raw yt-dlp info_dicts, referenced by opaque tokens"""
+
+    def __init__(self, max_entries=None, ttl=None):
+        self.max_entries = max_entries or int(os.environ.get('INFO_DICT_STORE_SIZE', 64))
+        self.ttl = ttl or int(os.environ.get('INFO_DICT_TTL', 900))
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, video_key, info_dict):
+        """Keep info_dict for later download and return its token"""
+        token = secrets.token_urlsafe(16)
+        with self._lock:
+            self._entries[token] = (time.time(), video_key, info_dict)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return token
+
+    def get(self, token, video_key):
+        """Return the info_dict for token if it is still fresh and belongs to video_key"""
+        if not token:
+            return None
+        with self._lock:
+            entry = self._entries.get(token)
+            if not entry:
+                return None
+            stored_at, stored_key, info_dict = entry
+            if time.time() - stored_at >= self.ttl:
+                del self._entries[token]
+                return None
+            if stored_key != video_key:
+                return None
+            return info_dict
+
+    def contains(self, token):
+        with self._lock:
+            entry = self._entries.get(token)
+            return bool(entry) and time.time() - entry[0] < self.ttl
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'max_entries': self.max_entries, 'ttl': self.ttl}
+
+
+# Info is also written to INFO_CACHE_DIR when set; raw info_dicts never leave this process
+info_cache = InfoCache()
+info_dict_store = InfoDictStore()
@@ -0,0 +1,160 @@
+import os
+import json
+import time
+import fcntl
+import shutil
+import logging
+import tempfile
+import threading
+
+
+class JobJournal:
+    """Durable per-job working directories so interrupted downloads can resume
+
+    Every queued download gets DOWNLOAD_WORK_DIR/<download_id>/ holding job.json (what
+    to download) next to yt-dlp's .part files. The owning process keeps an flock on
+    the directory's lock file; a job.json whose lock is free belongs to a process that
+    died, and the next process to serve requests picks it up so yt-dlp continues from the
+    partial file.
+    """
+
+    def __init__(self, root=None, max_resumes=None):
+        self.root = root or os.environ.get('DOWNLOAD_WORK_DIR') or os.path.join(tempfile.gettempdir(), 'clovix_jobs')
+        self.max_resumes = max_resumes or int(os.environ.get('JOB_MAX_RESUMES', 3))
+        self._locks = {}  # download_id -> open lock file held by this process
+        self._lock = threading.Lock()
+        self.resumed = 0
+
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            self.enabled = True
+        except OSError as e:
+            logging.error(f"Download work dir unavailable, downloads will not survive restarts: {str(e)}")
+            self.enabled = False
+
+    def work_dir(self, download_id):
+        """Stable working directory for a download"""
+        if not self.enabled:
+            return tempfile.mkdtemp()
+        path = os.path.join(self.root, download_id)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def record(self, download_id, params):
+        """Persist a job's parameters and take ownership of it"""
+        if not self.enabled or not self._claim(download_id):
+            return
+        self._write(download_id, {'download_id': download_id, 'params': params, 'created_at': time.time(), 'resumes': 0})
+
+    def finish(self, download_id):
+        """Forget a job that completed or failed for good; its directory is left to the caller"""
+        if not self.enabled:
+            return
+        try:
+            os.remove(self._job_file(download_id))
+        except OSError:
+            pass
+        self._release(download_id)
+
+    def release(self, download_id):
+        """Give up ownership but keep the job on disk for the next startup to resume"""
+        if self.enabled:
+            self._release(download_id)
+
+    def discard(self, download_id, work_dir):
+        """Drop a job that was never run, including its directory"""
+        self.finish(download_id)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    def claim_orphans(self):
+        """Take over jobs whose owning process is gone; returns [(download_id, params, partial_bytes)]"""
+        if not self.enabled:
+            return []
+        orphans = []
+        for download_id in sorted(os.listdir(self.root)):
+            job_file = self._job_file(download_id)
+            if not os.path.isfile(job_file):
+                self._remove_stale_dir(download_id)
+                continue
+            if not self._claim(download_id):
+                continue
+            try:
+                with open(job_file) as f:
+                    job = json.load(f)
+            except (OSError, ValueError) as e:
+                logging.warning(f"Unreadable job record for {download_id}: {str(e)}")
+                self.discard(download_id, os.path.join(self.root, download_id))
+                continue
+
+            if job.get('resumes', 0) >= self.max_resumes:
+                logging.warning(f"Giving up on download {download_id} after {job['resumes']} resumes")
+                self.discard(download_id, os.path.join(self.root, download_id))
+                continue
+
+            job['resumes'] = job.get('resumes', 0) + 1
+            self._write(download_id, job)
+            orphans.append((download_id, job['params'], self.partial_bytes(download_id)))
+            self.resumed += 1
+        return orphans
+
+    def partial_bytes(self, download_id):
+        """Bytes already on disk for a job, counting yt-dlp's .part files"""
+        total = 0
+        work_dir = os.path.join(self.root, download_id)
+        try:
+            for name in os.listdir(work_dir):
+                if name.endswith('.part') or '.part-Frag' in name:
+                    total += os.path.getsize(os.path.join(work_dir, name))
+        except OSError:
+            pass
+        return total
+
+    def stats(self):
+        with self._lock:
+            owned = len(self._locks)
+        return {'enabled': self.enabled, 'root': self.root, 'owned': owned, 'resumed': self.resumed}
+
+    def _remove_stale_dir(self, download_id):
+        # Leftovers of finished jobs or of a crash between finish() and cleanup
+        work_dir = os.path.join(self.root, download_id)
+        try:
+            if time.time() - os.path.getmtime(work_dir) > 3600 and self._claim(download_id):
+                self._release(download_id)
+                shutil.rmtree(work_dir, ignore_errors=True)
+        except OSError:
+            pass
+
+    def _job_file(self, download_id):
+        return os.path.join(self.root, download_id, 'job.json')
+
+    def _write(self, download_id, job):
+        path = self._job_file(download_id)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(job, f)
+        os.replace(tmp_path, path)
+
+    def _claim(self, download_id):
+        work_dir = os.path.join(self.root, download_id)
+        try:
+            lock_file = open(os.path.join(work_dir, '.lock'), 'a')
+        except OSError:
+            return False
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        with self._lock:
+            self._locks[download_id] = lock_file
+        return True
+
+    def _release(self, download_id):
+        with self._lock:
+            lock_file = self._locks.pop(download_id, None)
+        if lock_file:
+            lock_file.close()
+
+
+# Job records live on disk, so any process started after a crash can resume them
+job_journal = JobJournal()
@@ -0,0 +1,122 @@
+import gc
+import os
+import time
+import logging
+import threading
+
+
+def _parse_thresholds(value):
+    try:
+        thresholds = tuple(int(part) for part in value.split(','))
+        return thresholds if len(thresholds) == 3 else None
+    except (AttributeError, ValueError):
+        return None
+
+
+class MemoryPolicy:
+    """Process-wide garbage collection policy
+
+    Generational thresholds are raised so young-generation passes run less often,
+    objects alive after startup are frozen out of every later pass, and full
+    collections only happen when resident memory crosses a high watermark instead
+    of after every request.
+    """
+
+    def __init__(self, thresholds=None, high_watermark_mb=None, check_interval=None, cooldown=None):
+        self.thresholds = thresholds or _parse_thresholds(os.environ.get('GC_THRESHOLDS', '5000,20,20'))
+        self.high_watermark = (high_watermark_mb or int(os.environ.get('MEMORY_HIGH_WATERMARK_MB', 512))) * 1024 * 1024
+        # How often maybe_collect() actually reads RSS, and the minimum gap between forced collections
+        self.check_interval = check_interval or float(os.environ.get('MEMORY_CHECK_INTERVAL', 1))
+        self.cooldown = cooldown or float(os.environ.get('MEMORY_COLLECT_COOLDOWN', 10))
+        self.freeze_enabled = os.environ.get('GC_FREEZE', '1') != '0'
+
+        self._lock = threading.Lock()
+        self._last_check = 0.0
+        self._last_collect = 0.0
+        self._pause_started = None
+        self._page_size = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+        self.frozen = 0
+        self.last_rss = None
+        self.watermark_collections = 0
+        self.pauses = {generation: {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0} for generation in range(3)}
+        self._installed = False
+
+    def install(self):
+        """Apply thresholds and start recording collection pauses"""
+        if self._installed:
+            return
+        self._installed = True
+        if self.thresholds:
+            gc.set_threshold(*self.thresholds)
+        gc.callbacks.append(self._on_gc)
+        logging.info(f"GC policy: thresholds {gc.get_threshold()}, high watermark {self.high_watermark // (1024 * 1024)} MB")
+
+    def freeze_startup(self):
+        """Move everything allocated during startup into the permanent generation"""
+        if not self.freeze_enabled or not hasattr(gc, 'freeze'):
+            return
+        gc.collect()
+        gc.freeze()
+        self.frozen = gc.get_freeze_count()
+        logging.info(f"Froze {self.frozen} startup objects out of garbage collection")
+
+    def rss_bytes(self):
+        """Current resident set size, or None where /proc is unavailable"""
+        try:
+            with open('/proc/self/statm') as f:
+                return int(f.read().split()[1]) * self._page_size
+        except (OSError, ValueError, IndexError):
+            return None
+
+    def maybe_collect(self):
+        """Run a full collection only if RSS is above the high watermark; cheap to call often"""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_check < self.check_interval:
+                return False
+            self._last_check = now
+            rss = self.rss_bytes()
+            self.last_rss = rss
+            if rss is None or rss < self.high_watermark or now - self._last_collect < self.cooldown:
+                return False
+            self._last_collect = now
+            self.watermark_collections += 1
+
+        collected = gc.collect()
+        logging.info(f"RSS {rss // (1024 * 1024)} MB above watermark, collected {collected} objects")
+        return True
+
+    def stats(self):
+        return {
+            'thresholds': list(gc.get_threshold()),
+            'counts': list(gc.get_count()),
+            'frozen': self.frozen,
+            'rss_bytes': self.rss_bytes(),
+            'high_watermark_bytes': self.high_watermark,
+            'watermark_collections': self.watermark_collections,
+            'pauses': {
+                str(generation): {
+                    'count': pause['count'],
+                    'total_ms': round(pause['total_ms'], 3),
+                    'max_ms': round(pause['max_ms'], 3),
+                }
+                for generation, pause in self.pauses.items()
+            },
+        }
+
+    def _on_gc(self, phase, info):
+        # Runs inside the collector with the GIL held, so plain counters are safe
+        if phase == 'start':
+            self._pause_started = time.perf_counter()
+        elif self._pause_started is not None:
+            elapsed_ms = (time.perf_counter() - self._pause_started) * 1000
+            self._pause_started = None
+            pause = self.pauses[info['generation']]
+            pause['count'] += 1
+            pause['total_ms'] += elapsed_ms
+            if elapsed_ms > pause['max_ms']:
+                pause['max_ms'] = elapsed_ms
+
+
+# RSS and collector state belong to the process, so there is exactly one policy per process
+memory_policy = MemoryPolicy()
@@ -0,0 +1,67 @@
+import os
+import mimetypes
+
+# yt-dlp CLI arguments that print the final file path once it is in place
+PRINT_FILEPATH_ARGS = ['--print', 'after_move:filepath']
+
+
+def file_result(path):
+    """Job result for a finished file: exact path, size and mime type"""
+    return {
+        'file_path': path,
+        'filename': os.path.basename(path),
+        'filesize': os.path.getsize(path),
+        'mime_type': mimetypes.guess_type(path)[0] or 'application/octet-stream',
+    }
+
+
+def path_from_output(stdout):
+    """Final path printed by a yt-dlp run with PRINT_FILEPATH_ARGS, or None"""
+    for line in reversed((stdout or '').splitlines()):
+        if line.strip() and os.path.isfile(line.strip()):
+            return line.strip()
+    return None
+
+
+class OutputTracker:
+    """Files yt-dlp reports while downloading, so results never come from scanning temp_dir
+
+    progress_hooks report each downloaded stream as it finishes and postprocessor_hooks
+    report the file every postprocessor (merger, audio extraction, move) works on. The
+    output is the most recent of those that still exists: intermediate streams are
+    deleted after merging or conversion, .part files are renamed when complete.
+    """
+
+    def __init__(self, progress_hook=None):
+        self.paths = []
+        self._progress_hook = progress_hook
+
+    def install(self, ydl_opts):
+        """Add the tracking hooks to ydl_opts, chaining the caller's progress hook"""
+        ydl_opts['progress_hooks'] = [self._on_progress]
+        ydl_opts['postprocessor_hooks'] = [self._on_postprocess]
+        return self
+
+    def add(self, path):
+        if path and (not self.paths or self.paths[-1] != path):
+            self.paths.append(path)
+
+    def output_path(self):
+        for path in reversed(self.paths):
+            if os.path.isfile(path):
+                return path
+        return None
+
+    def result(self):
+        """file_result() for the tracked output, or None if yt-dlp reported no file"""
+        path = self.output_path()
+        return file_result(path) if path else None
+
+    def _on_progress(self, d):
+        if d['status'] == 'finished':
+            self.add(d.get('filename'))
+        if self._progress_hook:
+            self._progress_hook(d)
+
+    def _on_postprocess(self, d):
+        self.add((d.get('info_dict') or {}).get('filepath'))
@@ -0,0 +1,364 @@
+import os
+import json
+import time
+import logging
+import sqlite3
+import tempfile
+import itertools
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+
+class ProgressRecord:
+    """Compact per-download progress state"""
+
+    __slots__ = ('status', 'progress', 'active', 'timestamp', 'updated_at', 'version',
+                 'queue_position', 'file_path', 'filename', 'error', 'cached', 'extra')
+
+    FIELDS = ('status', 'progress', 'active', 'timestamp', 'queue_position',
+              'file_path', 'filename', 'error', 'cached')
+
+    def __init__(self):
+        now = time.time()
+        self.status = 'starting'
+        self.progress = 0
+        self.active = True
+        self.timestamp = now
+        self.updated_at = now
+        self.version = 0
+        self.queue_position = None
+        self.file_path = None
+        self.filename = None
+        self.error = None
+        self.cached = None
+        self.extra = None
+
+    def apply(self, fields):
+        for key, value in fields.items():
+            if key in self.FIELDS:
+                setattr(self, key, value)
+            elif value is None:
+                # Clearing an extra drops it, the same as the SQLite backend does
+                if self.extra:
+                    self.extra.pop(key, None)
+            else:
+                if self.extra is None:
+                    self.extra = {}
+                self.extra[key] = value
+        self.updated_at = time.time()
+        self.version += 1
+
+    def to_dict(self):
+        data = {key: getattr(self, key) for key in self.FIELDS if getattr(self, key) is not None}
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+
+class ProgressBackend(ABC):
+    """Storage interface for progress records
+
+    Backends hold plain field dicts at their boundary so records can live in memory
+    or in storage shared between worker processes.
+    """
+
+    # True when other processes see the same records
+    shared = False
+
+    @abstractmethod
+    def create(self, download_id, fields):
+        pass
+
+    @abstractmethod
+    def update(self, download_id, fields):
+        """Apply fields and return the new version, or None if the record is gone"""
+
+    @abstractmethod
+    def get(self, download_id):
+        """Return (fields, version) or (None, None)"""
+
+    @abstractmethod
+    def delete(self, download_id):
+        pass
+
+    @abstractmethod
+    def expire(self, is_expired, limit):
+        """Remove up to limit of the least recently updated records for which is_expired(fields, updated_at)"""
+
+    @abstractmethod
+    def evict_oldest(self):
+        """Remove the least recently updated record, preferring inactive ones"""
+
+    @abstractmethod
+    def count(self):
+        pass
+
+    @abstractmethod
+    def clear(self):
+        pass
+
+
+class MemoryProgressBackend(ProgressBackend):
+    """Per-process backend keeping records in update order"""
+
+    def __init__(self):
+        self._records = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self, download_id, fields):
+        record = ProgressRecord()
+        record.apply(fields)
+        with self._lock:
+            self._records[download_id] = record
+            self._records.move_to_end(download_id)
+
+    def update(self, download_id, fields):
+        with self._lock:
+            record = self._records.get(download_id)
+            if record is None:
+                return None
+            record.apply(fields)
+            self._records.move_to_end(download_id)
+            return record.version
+
+    def get(self, download_id):
+        with self._lock:
+            record = self._records.get(download_id)
+            if record is None:
+                return None, None
+            return record.to_dict(), record.version
+
+    def delete(self, download_id):
+        with self._lock:
+            self._records.pop(download_id, None)
+
+    def expire(self, is_expired, limit):
+        removed = []
+        with self._lock:
+            for download_id, record in list(itertools.islice(self._records.items(), limit)):
+                if is_expired(record.to_dict(), record.updated_at):
+                    del self._records[download_id]
+                    removed.append(download_id)
+        return removed
+
+    def evict_oldest(self):
+        with self._lock:
+            if not self._records:
+                return None
+            victim = next((i for i, r in self._records.items() if not r.active), None)
+            if victim is None:
+                victim = next(iter(self._records))
+            del self._records[victim]
+            return victim
+
+    def count(self):
+        with self._lock:
+            return len(self._records)
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+
+
+class SQLiteProgressBackend(ProgressBackend):
+    """Backend shared by every worker process on a host, stored in a WAL-mode SQLite file"""
+
+    shared = True
+
+    def __init__(self, path=None):
+        self.path = path or os.environ.get('PROGRESS_DB_PATH') or os.path.join(tempfile.gettempdir(), 'clovix_progress.db')
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS progress ('
+            'id TEXT PRIMARY KEY, data TEXT NOT NULL, active INTEGER NOT NULL, '
+            'version INTEGER NOT NULL, updated_at REAL NOT NULL)'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS progress_updated ON progress (updated_at)')
+        logging.info(f"Progress store using SQLite at {self.path}")
+
+    def _conn(self):
+        # One connection per thread, reopened after a fork (gunicorn --preload)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def create(self, download_id, fields):
+        now = time.time()
+        record = dict(fields)
+        record.setdefault('status', 'starting')
+        record.setdefault('progress', 0)
+        record.setdefault('active', True)
+        record.setdefault('timestamp', now)
+        record = {key: value for key, value in record.items() if value is not None}
+        self._conn().execute(
+            'INSERT OR REPLACE INTO progress (id, data, active, version, updated_at) VALUES (?, ?, ?, 1, ?)',
+            (download_id, json.dumps(record), int(bool(record.get('active'))), now)
+        )
+
+    def update(self, download_id, fields):
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT data, version FROM progress WHERE id = ?', (download_id,)).fetchone()
+            if row is None:
+                conn.execute('COMMIT')
+                return None
+            record = json.loads(row[0])
+            record.update(fields)
+            record = {key: value for key, value in record.items() if value is not None}
+            version = row[1] + 1
+            conn.execute(
+                'UPDATE progress SET data = ?, active = ?, version = ?, updated_at = ? WHERE id = ?',
+                (json.dumps(record), int(bool(record.get('active'))), version, time.time(), download_id)
+            )
+            conn.execute('COMMIT')
+            return version
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def get(self, download_id):
+        row = self._conn().execute('SELECT data, version FROM progress WHERE id = ?', (download_id,)).fetchone()
+        if row is None:
+            return None, None
+        return json.loads(row[0]), row[1]
+
+    def delete(self, download_id):
+        self._conn().execute('DELETE FROM progress WHERE id = ?', (download_id,))
+
+    def expire(self, is_expired, limit):
+        conn = self._conn()
+        rows = conn.execute(
+            'SELECT id, data, updated_at FROM progress ORDER BY updated_at LIMIT ?', (limit,)
+        ).fetchall()
+        removed = [download_id for download_id, data, updated_at in rows if is_expired(json.loads(data), updated_at)]
+        for download_id in removed:
+            conn.execute('DELETE FROM progress WHERE id = ?', (download_id,))
+        return removed
+
+    def evict_oldest(self):
+        conn = self._conn()
+        row = conn.execute(
+            'SELECT id FROM progress ORDER BY active, updated_at LIMIT 1'
+        ).fetchone()
+        if row is None:
+            return None
+        conn.execute('DELETE FROM progress WHERE id = ?', (row[0],))
+        return row[0]
+
+    def count(self):
+        return self._conn().execute('SELECT COUNT(*) FROM progress').fetchone()[0]
+
+    def clear(self):
+        self._conn().execute('DELETE FROM progress')
+
+
+def backend_from_env():
+    """Pick the progress backend named by PROGRESS_BACKEND ('memory' or 'sqlite')"""
+    name = os.environ.get('PROGRESS_BACKEND', 'memory').lower()
+    if name == 'sqlite':
+        try:
+            return SQLiteProgressBackend()
+        except Exception as e:
+            logging.error(f"SQLite progress backend unavailable, using memory: {str(e)}")
+    return MemoryProgressBackend()
+
+
+class ProgressStore:
+    """Thread-safe registry of download progress with a hard size cap and incremental TTL eviction"""
+
+    def __init__(self, backend=None, max_entries=None, finished_ttl=None, idle_ttl=None, stale_ttl=None):
+        self.backend = backend or backend_from_env()
+        self.max_entries = max_entries or int(os.environ.get('PROGRESS_MAX_ENTRIES', 5000))
+        # Finished/failed records, other inactive records, and records whose job stopped updating
+        self.finished_ttl = finished_ttl or int(os.environ.get('PROGRESS_FINISHED_TTL', 300))
+        self.idle_ttl = idle_ttl or int(os.environ.get('PROGRESS_IDLE_TTL', 600))
+        self.stale_ttl = stale_ttl or int(os.environ.get('PROGRESS_STALE_TTL', 3600))
+        self.sweep_batch = 16
+
+        self._changed = threading.Condition()
+        self.evictions = 0
+
+    def create(self, download_id, **fields):
+        self.sweep()
+        while self.backend.count() >= self.max_entries:
+            victim = self.backend.evict_oldest()
+            if victim is None:
+                break
+            self.evictions += 1
+            logging.warning(f"Progress store full, evicted {victim}")
+        self.backend.create(download_id, fields)
+        self._notify()
+
+    def update(self, download_id, **fields):
+        """Apply fields to an existing record; returns False if it no longer exists"""
+        version = self.backend.update(download_id, fields)
+        if version is None:
+            return False
+        self._notify()
+        if version % 32 == 0:
+            self.sweep()
+        return True
+
+    def get(self, download_id):
+        return self.backend.get(download_id)[0]
+
+    def snapshot(self, download_id):
+        """Return (fields, version) without waiting"""
+        return self.backend.get(download_id)
+
+    def delete(self, download_id):
+        self.backend.delete(download_id)
+        self._notify()
+
+    def wait_for_change(self, download_id, last_version, timeout):
+        """Block until the record's version differs from last_version; returns (fields, version)"""
+        deadline = time.time() + timeout
+        while True:
+            fields, version = self.backend.get(download_id)
+            remaining = deadline - time.time()
+            if version != last_version or remaining <= 0:
+                return fields, version
+            with self._changed:
+                # Other processes cannot notify us, so short waits double as polling for shared backends
+                self._changed.wait(min(remaining, 1.0))
+
+    def sweep(self, limit=None):
+        """Evict a bounded batch of expired records, oldest updates first"""
+        now = time.time()
+
+        def is_expired(fields, updated_at):
+            age = now - updated_at
+            if fields.get('active'):
+                return age > self.stale_ttl
+            if fields.get('status') in ['finished', 'error']:
+                return age > self.finished_ttl
+            return age > self.idle_ttl
+
+        removed = self.backend.expire(is_expired, limit or self.sweep_batch)
+        for download_id in removed:
+            logging.info(f"Cleaned up old download: {download_id}")
+        self.evictions += len(removed)
+        return removed
+
+    def clear(self):
+        self.backend.clear()
+        self._notify()
+
+    def stats(self):
+        return {
+            'entries': self.backend.count(),
+            'max_entries': self.max_entries,
+            'evictions': self.evictions,
+            'backend': type(self.backend).__name__,
+        }
+
+    def _notify(self):
+        with self._changed:
+            self._changed.notify_all()
@@ -2,6 +2,7 @@ class VideoDownloader {
     constructor() {
         this.currentDownloadId = null;
         this.progressInterval = null;
+        this.progressSource = null;
         this.selectedType = 'video'; // Default to video
         this.videoData = null;
         this.init();
@@ -299,7 +300,8 @@ class VideoDownloader {
                     url: url,
                     format_id: formatId,
                     audio_only: this.selectedType === 'audio',
-                    file_format: fileFormat
+                    file_format: fileFormat,
+                    info_token: this.videoData?.info_token
                 })
             });
 
@@ -360,7 +362,8 @@ class VideoDownloader {
                     url: url,
                     format_id: formatId,
                     audio_only: this.selectedType === 'audio',
-                    file_format: fileFormat
+                    file_format: fileFormat,
+                    info_token: this.videoData?.info_token
                 })
             });
 
@@ -439,7 +442,12 @@ class VideoDownloader {
             if (!response.ok) {
                 const errorText = await response.text();
                 console.error('Response error:', errorText);
-                throw new Error(`Server error: ${response.status}`);
+                // Timeouts (504) and other JSON errors carry a message worth showing
+                let message = `Server error: ${response.status}`;
+                try {
+                    message = JSON.parse(errorText).error || message;
+                } catch (e) {}
+                throw new Error(message);
             }
 
             const data = await response.json();
@@ -476,6 +484,77 @@ class VideoDownloader {
     trackDownloadProgress() {
         if (!this.currentDownloadId) return;
 
+        // Event streams only when the server runs under ASGI; a sync worker would be held for the whole job
+        const mode = document.body.dataset.progressEvents;
+        if (window.EventSource && mode === 'sse') {
+            this.trackDownloadEvents();
+        } else {
+            this.longPollDownloadProgress(mode === 'long-poll' ? 0 : 1000);
+        }
+    }
+
+    async longPollDownloadProgress(delay) {
+        const downloadId = this.currentDownloadId;
+        let version = null;
+
+        // A threaded server holds each request until the next change; a sync worker answers at once,
+        // so wait between requests there. Stop when another download starts
+        while (this.currentDownloadId === downloadId) {
+            if (version && delay) {
+                await new Promise(resolve => setTimeout(resolve, delay));
+            }
+
+            let response;
+            try {
+                response = await fetch(`/download_events/${downloadId}`, {
+                    cache: 'no-store',
+                    headers: version ? { 'If-None-Match': version } : {}
+                });
+            } catch (error) {
+                response = null;
+            }
+
+            if (response && response.status === 304) {
+                continue;
+            }
+            if (!response || (!response.ok && response.status !== 404)) {
+                console.log('Progress long-poll failed, falling back to polling');
+                this.pollDownloadProgress();
+                return;
+            }
+
+            version = response.headers.get('ETag');
+            const state = this.handleProgressData(await response.json());
+            if (state === 'done' || state === 'error') {
+                return;
+            }
+        }
+    }
+
+    trackDownloadEvents() {
+        const source = new EventSource(`/download_events/${this.currentDownloadId}`);
+        this.progressSource = source;
+
+        source.onmessage = (event) => {
+            const state = this.handleProgressData(JSON.parse(event.data));
+            if (state === 'done' || state === 'error') {
+                this.progressSource = null;
+                source.close();
+            }
+        };
+
+        source.onerror = () => {
+            // Fall back to polling if the event stream is unavailable
+            source.close();
+            if (this.progressSource === source) {
+                console.log('Progress event stream failed, falling back to polling');
+                this.progressSource = null;
+                this.pollDownloadProgress();
+            }
+        };
+    }
+
+    pollDownloadProgress() {
         let attempts = 0;
         const maxAttempts = 120; // 1 minute timeout
 
@@ -492,30 +571,13 @@ class VideoDownloader {
 
             try {
                 const response = await fetch(`/download_progress/${this.currentDownloadId}`);
-                const data = await response.json();
+                const state = this.handleProgressData(await response.json());
 
-                console.log('Progress data received:', data);
-                
-                if (data.error) {
-                    console.error('Download error:', data.error);
+                if (state === 'queued') {
+                    // Waiting for a free worker does not count towards the timeout
+                    attempts = 0;
+                } else if (state === 'done' || state === 'error') {
                     clearInterval(this.progressInterval);
-                    this.showError(data.error);
-                    this.hideDownloadProgress();
-                    return;
-                }
-                
-                if (data.progress !== undefined) {
-                    this.updateProgress(data.progress, data.status || 'Downloading...');
-
-                    if (data.progress >= 100 || data.status === 'finished') {
-                        clearInterval(this.progressInterval);
-                        this.showDownloadComplete();
-                        setTimeout(() => {
-                            this.triggerFileDownload();
-                        }, 500);
-                    }
-                } else {
-                    console.log('No progress data available yet');
                 }
             } catch (error) {
                 console.error('Progress tracking error:', error);
@@ -526,6 +588,46 @@ class VideoDownloader {
         }, 500);
     }
 
+    handleProgressData(data) {
+        console.log('Progress data received:', data);
+        
+        if (data.error) {
+            console.error('Download error:', data.error);
+            this.showError(data.error);
+            this.hideDownloadProgress();
+            return 'error';
+        }
+        
+        if (data.status === 'queued') {
+            const position = data.queue_position ? ` (position ${data.queue_position})` : '';
+            this.updateProgress(0, `Waiting in queue${position}...`);
+            return 'queued';
+        }
+
+        if (data.progress === undefined) {
+            console.log('No progress data available yet');
+            return 'pending';
+        }
+
+        const statusLabels = {
+            downloading: 'Downloading...',
+            processing: 'Processing...',
+            converting: 'Converting...',
+            resumed: 'Resuming...'
+        };
+        this.updateProgress(data.progress, statusLabels[data.status] || data.status || 'Downloading...');
+
+        // Only a finished job that is no longer active has its final file ready
+        if (data.status === 'finished' && !data.active) {
+            this.showDownloadComplete();
+            setTimeout(() => {
+                this.triggerFileDownload();
+            }, 500);
+            return 'done';
+        }
+        return 'pending';
+    }
+
     showDownloadComplete() {
         const completeDiv = document.getElementById('download-complete');
         if (completeDiv) completeDiv.style.display = 'block';
@@ -0,0 +1,102 @@
+import os
+import queue
+import logging
+import threading
+
+
+class StrategyRacer:
+    """Run extraction strategies side by side and keep the first decisive outcome
+
+    Up to width strategies of one request run at once; when one fails the next one in
+    the list starts. Every attempt beyond a request's first needs a slot from a budget
+    shared by the whole process, so under load racing degrades to trying strategies one
+    by one. yt-dlp calls cannot be interrupted, so losing attempts are abandoned: their
+    results are dropped and strategies that have not started yet are skipped. With
+    width 1 (the default) strategies simply run in order on the calling thread.
+    """
+
+    def __init__(self, width=None, budget=None):
+        self.width = width or int(os.environ.get('EXTRACTION_RACE_WIDTH', 1))
+        self.budget = budget or int(os.environ.get('EXTRACTION_RACE_BUDGET', 16))
+        self._slots = threading.BoundedSemaphore(self.budget)
+        self._lock = threading.Lock()
+        self.races = 0
+        self.extra_attempts = 0
+        self.budget_denied = 0
+        self.abandoned = 0
+
+    def run(self, strategies, attempt):
+        """Return the first non-None attempt(strategy), or None when every strategy came back empty
+
+        attempt returns a result to stop with (success or an error worth reporting) or
+        None to move on; an exception counts as None.
+        """
+        if self.width <= 1 or len(strategies) <= 1:
+            for strategy in strategies:
+                result = self._attempt(attempt, strategy)
+                if result is not None:
+                    return result
+            return None
+
+        with self._lock:
+            self.races += 1
+        pending = list(strategies)
+        running = 0
+        results = queue.Queue()
+        abandoned = threading.Event()
+
+        def run_one(strategy, has_slot):
+            try:
+                result = None if abandoned.is_set() else self._attempt(attempt, strategy)
+            finally:
+                if has_slot:
+                    self._slots.release()
+            results.put(result)
+
+        while pending or running:
+            # The first attempt always runs; the others need a slot from the shared budget
+            while pending and running < self.width:
+                has_slot = running > 0
+                if has_slot and not self._slots.acquire(blocking=False):
+                    with self._lock:
+                        self.budget_denied += 1
+                    break
+                if has_slot:
+                    with self._lock:
+                        self.extra_attempts += 1
+                threading.Thread(target=run_one, args=(pending.pop(0), has_slot),
+                                 name='strategy-race', daemon=True).start()
+                running += 1
+
+            result = results.get()
+            running -= 1
+            if result is not None:
+                abandoned.set()
+                if running:
+                    with self._lock:
+                        self.abandoned += running
+                    logging.info(f"Strategy race decided, abandoning {running} slower attempts")
+                return result
+        return None
+
+    def stats(self):
+        with self._lock:
+            return {
+                'width': self.width,
+                'budget': self.budget,
+                'races': self.races,
+                'extra_attempts': self.extra_attempts,
+                'budget_denied': self.budget_denied,
+                'abandoned': self.abandoned,
+            }
+
+    def _attempt(self, attempt, strategy):
+        try:
+            return attempt(strategy)
+        except Exception as e:
+            logging.warning(f"Extraction strategy crashed: {str(e)}")
+            return None
+
+
+# EXTRACTION_RACE_BUDGET only limits extra attempts if every request races through this instance
+strategy_racer = StrategyRacer()
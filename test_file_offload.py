@@ -0,0 +1,137 @@
+"""
+Integration test for FILE_OFFLOAD: /download_file behind a stand-in front proxy
+that follows X-Accel-Redirect / X-Sendfile into the file store, as nginx.conf.example does
+"""
+
+import os
+import tempfile
+from urllib.parse import unquote
+
+# Keep the app import from starting background network work
+os.environ.setdefault('YTDLP_CACHE_WARMUP', '0')
+# ... and away from a live server's jobs, stored files and shared progress
+_scratch = tempfile.mkdtemp(prefix='clovix-test-')
+os.environ.setdefault('DOWNLOAD_WORK_DIR', os.path.join(_scratch, 'jobs'))
+os.environ.setdefault('FILE_STORE_DIR', os.path.join(_scratch, 'files'))
+os.environ.setdefault('PROGRESS_BACKEND', 'memory')
+
+import pytest
+from werkzeug.datastructures import Headers
+from werkzeug.test import Client
+
+import app as app_module
+import file_serving
+from file_store import FileStore
+
+
+class StandInProxy:
+    """WSGI stand-in for the front proxy: serves the file a response hands off, drops the hand-off header"""
+
+    def __init__(self, app, prefix, root):
+        self.app = app
+        self.prefix = prefix
+        self.root = root
+        self.offloaded = []
+
+    def __call__(self, environ, start_response):
+        captured = {}
+
+        def capture(status, headers, exc_info=None):
+            captured['status'], captured['headers'] = status, headers
+
+        result = self.app(environ, capture)
+        try:
+            body = b''.join(result)
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+
+        headers = Headers(captured['headers'])
+        accel = headers.pop('X-Accel-Redirect', None)
+        sendfile = headers.pop('X-Sendfile', None)
+        if accel:
+            # Like an nginx internal location: only the configured prefix maps onto the store
+            assert accel.startswith(self.prefix)
+            path = os.path.join(self.root, unquote(accel[len(self.prefix):]))
+        elif sendfile:
+            path = sendfile
+        else:
+            start_response(captured['status'], headers.to_wsgi_list())
+            return [body]
+
+        assert body == b'', 'an offloaded response must not carry a body'
+        self.offloaded.append(path)
+        with open(path, 'rb') as f:
+            data = f.read()
+        headers['Content-Length'] = str(len(data))
+        start_response('200 OK', headers.to_wsgi_list())
+        return [data]
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    file_store = FileStore(root=str(tmp_path / 'store'))
+    monkeypatch.setattr(app_module, 'file_store', file_store)
+    return file_store
+
+
+def stored_download(store, tmp_path, download_id, name, data=b'video bytes' * 100):
+    src = tmp_path / name
+    src.write_bytes(data)
+    path = store.add(store.key(download_id, None, None, False), str(src))
+    app_module.progress_store.create(download_id, status='finished', progress=100, active=False, file_path=path)
+    return path, data
+
+
+def proxied_client(store, mode, monkeypatch):
+    monkeypatch.setattr(file_serving, 'FILE_OFFLOAD', mode)
+    proxy = StandInProxy(app_module.app, file_serving.FILE_OFFLOAD_PREFIX, store.root)
+    return Client(proxy), proxy
+
+
+@pytest.mark.parametrize('mode', ['x-accel-redirect', 'x-sendfile'])
+def test_proxy_sends_stored_file(mode, store, tmp_path, monkeypatch):
+    path, data = stored_download(store, tmp_path, f'offload-{mode}', 'clip.mp4')
+    client, proxy = proxied_client(store, mode, monkeypatch)
+
+    response = client.get(f'/download_file/offload-{mode}')
+
+    assert response.status_code == 200
+    assert response.data == data
+    assert [os.path.realpath(sent) for sent in proxy.offloaded] == [os.path.realpath(path)]
+    assert 'filename=clip.mp4' in response.headers['Content-Disposition']
+
+
+def test_non_ascii_name_survives_the_hand_off(store, tmp_path, monkeypatch):
+    path, data = stored_download(store, tmp_path, 'offload-unicode', '日本語 clip.mp4')
+    client, proxy = proxied_client(store, 'x-accel-redirect', monkeypatch)
+
+    response = client.get('/download_file/offload-unicode')
+
+    assert response.status_code == 200
+    assert response.data == data
+    assert "filename*=UTF-8''%E6%97%A5%E6%9C%AC%E8%AA%9E%20clip.mp4" in response.headers['Content-Disposition']
+
+
+def test_files_outside_the_store_are_served_by_the_app(store, tmp_path, monkeypatch):
+    outside = tmp_path / 'elsewhere.mp4'
+    outside.write_bytes(b'not in the store')
+    app_module.progress_store.create('offload-outside', status='finished', progress=100, active=False,
+                                     file_path=str(outside))
+    client, proxy = proxied_client(store, 'x-accel-redirect', monkeypatch)
+
+    response = client.get('/download_file/offload-outside')
+
+    assert response.status_code == 200
+    assert response.data == b'not in the store'
+    assert proxy.offloaded == []
+
+
+def test_offload_off_by_default(store, tmp_path, monkeypatch):
+    _, data = stored_download(store, tmp_path, 'offload-off', 'clip.mp4')
+    client, proxy = proxied_client(store, '', monkeypatch)
+
+    response = client.get('/download_file/offload-off')
+
+    assert response.data == data
+    assert proxy.offloaded == []
@@ -2,21 +2,59 @@ import yt_dlp
 import tempfile
 import os
 import logging
-import gc
 import time
 import random
 import subprocess
 import json
+import copy
+import shutil
+import select
 from contextlib import contextmanager
+from memory_policy import memory_policy
+from ydl_pool import ydl_pool
+from ytdlp_cache import ytdlp_cache
+from strategy_race import strategy_racer
+from deadline import Deadline, DeadlineExceeded
+from download_scheduler import connection_budget
+from conversion import conversion_executor
+from output_tracker import OutputTracker, file_result
+from conversion_plan import (probe_streams, streams_from_info, plan_conversion, full_transcode_plan,
+                             pick_native_format, pick_pipe_format)
+from yt_dlp.extractor import gen_extractor_classes
+from info_cache import info_cache, info_dict_store
+
+# Extractor classes are loaded once and reused for canonical ID lookups
+_extractor_classes = None
 
 class VideoDownloader:
-    def __init__(self):
-        self.temp_dir = tempfile.mkdtemp()
+    def __init__(self, work_dir=None):
+        # A stable work_dir lets a restarted job continue from yt-dlp's .part files
+        self.temp_dir = work_dir or tempfile.mkdtemp()
+        # Raw yt-dlp info_dict from the most recent successful extraction
+        self.last_info_dict = None
+        # Time budget of the request or job currently using this downloader
+        self.deadline = Deadline()
         logging.info("VideoDownloader initialized successfully")
 
     @contextmanager
-    def memory_managed_extraction(self, ydl_opts):
-        """Context manager for memory-efficient video extraction"""
+    def memory_managed_extraction(self, ydl_opts, pooled=False):
+        """Context manager for memory-efficient video extraction
+
+        pooled=True borrows a warm instance from the shared pool; only for extract_info
+        without downloading.
+        """
+        # Shared player/signature cache instead of yt-dlp's per-user default
+        ytdlp_cache.apply(ydl_opts)
+        # No single request may outlast the caller's budget; fails fast once it is spent
+        ydl_opts['socket_timeout'] = self.deadline.timeout(ydl_opts.get('socket_timeout', 20), 'extraction')
+        if pooled:
+            try:
+                with ydl_pool.checkout(ydl_opts) as ydl:
+                    yield ydl
+            finally:
+                memory_policy.maybe_collect()
+            return
+        
         ydl = None
         try:
             ydl = yt_dlp.YoutubeDL(ydl_opts)
@@ -27,14 +65,61 @@ class VideoDownloader:
                     ydl.close()
                 except:
                     pass
-            gc.collect()
+            # Full collections only when memory is actually high
+            memory_policy.maybe_collect()
 
-    def get_video_info(self, url):
+    def get_video_info(self, url, deadline=None):
         """Extract video information with platform-specific handling"""
+        self.deadline = deadline or Deadline()
+        cache_key = self.canonical_id(url)
+        cached = info_cache.get(cache_key)
+        if cached:
+            logging.info(f"Video info cache hit for {cache_key}")
+            cached['working_url'] = url
+            if not info_dict_store.contains(cached.get('info_token')):
+                cached.pop('info_token', None)
+            return cached
+
+        self.last_info_dict = None
         if 'youtube.com' in url or 'youtu.be' in url:
-            return self._get_youtube_info_with_bypass(url)
+            video_info = self._get_youtube_info_with_bypass(url)
         else:
-            return self._get_video_info_other_platforms(url)
+            video_info = self._get_video_info_other_platforms(url)
+
+        # Strategies cut short by the deadline say nothing about the video itself
+        if self.deadline.expired() and ('error' in video_info or 'server_notice' in video_info):
+            logging.warning(f"Info extraction for {url} ran out of time")
+            return {'error': self.deadline.message('Analyzing this video'), 'timed_out': True}
+
+        # Fallback responses carry a server_notice and must not be cached
+        if 'error' not in video_info and 'server_notice' not in video_info:
+            if self.last_info_dict:
+                video_info['info_token'] = info_dict_store.put(cache_key, self.last_info_dict)
+            info_cache.put(cache_key, video_info)
+        return video_info
+
+    def canonical_id(self, url):
+        """Normalized video identity: YouTube video ID, else extractor key + ID"""
+        global _extractor_classes
+
+        if 'youtube.com' in url or 'youtu.be' in url:
+            video_id = self._extract_video_id(url)
+            if video_id:
+                return f"youtube:{video_id}"
+
+        try:
+            if _extractor_classes is None:
+                _extractor_classes = [ie for ie in gen_extractor_classes() if ie.ie_key() != 'Generic']
+            for ie in _extractor_classes:
+                if ie.suitable(url):
+                    temp_id = ie.get_temp_id(url)
+                    if temp_id:
+                        return f"{ie.ie_key()}:{temp_id}"
+                    break
+        except Exception as e:
+            logging.warning(f"Could not resolve extractor for {url}: {str(e)}")
+
+        return f"url:{url.strip()}"
 
     def _get_youtube_info_with_bypass(self, url):
         """Ultimate YouTube extraction that bypasses IP blocking using multiple strategies"""
@@ -132,32 +217,40 @@ class VideoDownloader:
             }
         ]
         
-        for i, strategy in enumerate(bypass_strategies):
+        def attempt(numbered):
+            i, strategy = numbered
             try:
-                logging.info(f"Trying YouTube bypass strategy {i+1}: {strategy['name']}")
+                logging.info(f"Trying YouTube bypass strategy {i}: {strategy['name']}")
                 
-                with self.memory_managed_extraction(strategy['opts']) as ydl:
+                with self.memory_managed_extraction(strategy['opts'], pooled=True) as ydl:
                     info = ydl.extract_info(url, download=False)
                     
                     if info and 'title' in info:
                         logging.info(f"Successfully extracted YouTube info with {strategy['name']}")
-                        return self._process_platform_info(info, url)
+                        return {'info': info}
                         
             except Exception as e:
                 error_msg = str(e).lower()
-                logging.warning(f"YouTube Strategy {i+1} failed: {str(e)}")
+                logging.warning(f"YouTube Strategy {i} failed: {str(e)}")
                 
                 # Don't stop for auth errors, continue to next strategy
                 if "sign in" in error_msg or "cookies" in error_msg or "authentication" in error_msg:
-                    continue
+                    return None
                 elif "private" in error_msg:
                     return {'error': 'This video is private and cannot be downloaded.'}
                 elif "unavailable" in error_msg or "removed" in error_msg:
                     return {'error': 'This video is no longer available.'}
                 elif "copyright" in error_msg:
                     return {'error': 'This video is not available due to copyright restrictions.'}
-                else:
-                    continue
+            return None
+        
+        # Strategies run in order, or raced when EXTRACTION_RACE_WIDTH > 1
+        outcome = strategy_racer.run(list(enumerate(bypass_strategies, 1)), attempt)
+        if outcome and 'info' in outcome:
+            self.last_info_dict = outcome['info']
+            return self._process_platform_info(outcome['info'], url)
+        if outcome:
+            return outcome
         
         # If all strategies fail, return fallback response
         logging.warning("All YouTube bypass strategies failed, returning fallback")
@@ -235,21 +328,26 @@ class VideoDownloader:
             }
         ]
 
-        for strategy in extraction_strategies:
+        def attempt(strategy):
             try:
                 logging.info(f"Trying {strategy['name']} for platform extraction")
                 
-                with self.memory_managed_extraction(strategy['opts']) as ydl:
+                with self.memory_managed_extraction(strategy['opts'], pooled=True) as ydl:
                     info = ydl.extract_info(url, download=False)
                     
                     if info:
                         logging.info(f"Successfully extracted info with {strategy['name']}")
-                        return self._process_platform_info(info, url)
+                        return info
                         
             except Exception as e:
                 error_msg = str(e)
                 logging.warning(f"{strategy['name']} failed: {error_msg}")
-                continue
+            return None
+        
+        info = strategy_racer.run(extraction_strategies, attempt)
+        if info:
+            self.last_info_dict = info
+            return self._process_platform_info(info, url)
         
         # Fallback response if all strategies fail
         return {'error': 'Could not extract video information. Please check the URL and try again.'}
@@ -330,11 +428,28 @@ class VideoDownloader:
             logging.error(f"Error processing video info: {str(e)}")
             return {'error': f'Error processing video information: {str(e)}'}
 
-    def download_video(self, url, format_id=None, audio_only=False, file_format=None, progress_hook=None):
+    def download_video(self, url, format_id=None, audio_only=False, file_format=None, progress_hook=None, info_dict=None,
+                       deadline=None):
         """Enhanced download with proper format selection for all platforms"""
+        self.deadline = deadline or Deadline()
+        
+        def checked_hook(d):
+            # Raising from a progress hook is the way to stop a running yt-dlp download
+            if d['status'] == 'downloading':
+                self.deadline.check('download')
+            if progress_hook:
+                progress_hook(d)
         
+        result = self._download_video(url, format_id, audio_only, file_format, checked_hook, info_dict)
+        
+        if self.deadline.expired() and (not result or 'error' in result):
+            logging.warning(f"Download of {url} ran out of time")
+            return {'error': self.deadline.message('This download'), 'timed_out': True}
+        return result
+
+    def _download_video(self, url, format_id=None, audio_only=False, file_format=None, progress_hook=None, info_dict=None):
         if 'youtube.com' in url or 'youtu.be' in url:
-            return self._download_youtube_with_bypass(url, format_id, audio_only, file_format, progress_hook)
+            return self._download_youtube_with_bypass(url, format_id, audio_only, file_format, progress_hook, info_dict)
         
         try:
             # Enhanced download options
@@ -347,8 +462,8 @@ class VideoDownloader:
                 'retries': 3,
             }
             
-            if progress_hook:
-                ydl_opts['progress_hooks'] = [progress_hook]
+            outputs = OutputTracker(progress_hook).install(ydl_opts)
+            self._add_connection_opts(ydl_opts)
             
             # FIXED: Proper format selection using actual format IDs
             if audio_only:
@@ -370,102 +485,38 @@ class VideoDownloader:
                 else:
                     ydl_opts['format'] = 'best[height<=1080]/best'
                 
-                # FIXED: Enhanced format conversion with proper codec settings and fallback strategy
+                # Remux-first conversion: download a format already in the target container when
+                # one exists, otherwise copy every stream the container accepts and transcode the rest
                 if file_format and file_format not in ['mp4']:
-                    # Try conversion with fallback to direct download
-                    conversion_strategies = []
-                    
-                    if file_format == '3gp':
-                        # First download the video normally
-                        logging.info("Starting 3GP conversion process")
-                        
-                        with self.memory_managed_extraction(ydl_opts) as ydl:
-                            ydl.download([url])
-                        
-                        # Find the downloaded MP4 file
-                        downloaded_file = None
-                        for filename in os.listdir(self.temp_dir):
-                            if (filename.endswith('.mp4') or filename.endswith('.webm') or filename.endswith('.mkv')) and os.path.isfile(os.path.join(self.temp_dir, filename)):
-                                downloaded_file = os.path.join(self.temp_dir, filename)
-                                break
-                        
-                        if downloaded_file:
-                            # Convert to 3GP using FFmpeg
-                            base_name = os.path.splitext(os.path.basename(downloaded_file))[0]
-                            gp3_path = os.path.join(self.temp_dir, f"{base_name}.3gp")
-                            
-                            try:
-                                import subprocess
-                                logging.info(f"Converting {downloaded_file} to 3GP format")
-                                
-                                result = subprocess.run([
-                                    'ffmpeg', '-i', downloaded_file, 
-                                    '-c:v', 'libx264', '-c:a', 'aac', 
-                                    '-f', '3gp', '-y', gp3_path
-                                ], capture_output=True, text=True)
-                                
-                                if result.returncode == 0 and os.path.exists(gp3_path):
-                                    logging.info(f"3GP conversion successful: {os.path.basename(gp3_path)}")
-                                    # Remove original file to save space
-                                    os.remove(downloaded_file)
-                                    return {'file_path': gp3_path, 'filename': os.path.basename(gp3_path)}
-                                else:
-                                    logging.error(f"FFmpeg 3GP conversion failed: {result.stderr}")
-                            except Exception as e:
-                                logging.error(f"FFmpeg 3GP conversion error: {str(e)}")
-                        
-                        # If conversion fails, return original
-                        logging.warning("3GP conversion failed, returning original file")
-                        for filename in os.listdir(self.temp_dir):
-                            if os.path.isfile(os.path.join(self.temp_dir, filename)):
-                                file_path = os.path.join(self.temp_dir, filename)
-                                return {'file_path': file_path, 'filename': filename}
-                        
-                    elif file_format in ['mkv', 'webm', 'avi', 'flv']:
-                        # First download the video normally
+                    if file_format in ['3gp', 'mkv', 'webm', 'avi', 'flv']:
                         logging.info(f"Starting {file_format} conversion process")
                         
-                        with self.memory_managed_extraction(ydl_opts) as ydl:
-                            ydl.download([url])
+                        native = None
+                        if format_id != 'worst':
+                            native = pick_native_format(info_dict, file_format,
+                                                        format_id if format_id not in ['best', 'server_blocked'] else None)
+                        if native:
+                            logging.info(f"Format {native['format']} is already {file_format}, no conversion needed")
+                            ydl_opts['format'] = native['format']
+                            if native['merge']:
+                                ydl_opts['merge_output_format'] = file_format
+                        elif format_id != 'worst':
+                            piped = self._download_and_convert_piped(url, format_id, file_format, progress_hook, info_dict)
+                            if piped:
+                                return piped
                         
-                        # Find the downloaded file
-                        downloaded_file = None
-                        for filename in os.listdir(self.temp_dir):
-                            if (filename.endswith('.mp4') or filename.endswith('.webm') or filename.endswith('.mkv')) and os.path.isfile(os.path.join(self.temp_dir, filename)):
-                                downloaded_file = os.path.join(self.temp_dir, filename)
-                                break
+                        with self.memory_managed_extraction(ydl_opts) as ydl:
+                            self._run_download(ydl, url, info_dict)
                         
+                        downloaded_file = outputs.output_path()
                         if downloaded_file:
-                            # Convert to target format using FFmpeg
-                            base_name = os.path.splitext(os.path.basename(downloaded_file))[0]
-                            new_path = os.path.join(self.temp_dir, f"{base_name}.{file_format}")
+                            converted = self._convert_to_container(downloaded_file, file_format, progress_hook, info_dict, format_id)
+                            if converted:
+                                return converted
                             
-                            try:
-                                import subprocess
-                                logging.info(f"Converting {downloaded_file} to {file_format} format")
-                                
-                                # Use codec copy for most formats to avoid re-encoding
-                                result = subprocess.run([
-                                    'ffmpeg', '-i', downloaded_file, 
-                                    '-c', 'copy', '-y', new_path
-                                ], capture_output=True, text=True)
-                                
-                                if result.returncode == 0 and os.path.exists(new_path):
-                                    logging.info(f"{file_format} conversion successful: {os.path.basename(new_path)}")
-                                    # Remove original file to save space
-                                    os.remove(downloaded_file)
-                                    return {'file_path': new_path, 'filename': os.path.basename(new_path)}
-                                else:
-                                    logging.error(f"FFmpeg {file_format} conversion failed: {result.stderr}")
-                            except Exception as e:
-                                logging.error(f"FFmpeg {file_format} conversion error: {str(e)}")
-                        
-                        # If conversion fails, return original
-                        logging.warning(f"{file_format} conversion failed, returning original file")
-                        for filename in os.listdir(self.temp_dir):
-                            if os.path.isfile(os.path.join(self.temp_dir, filename)):
-                                file_path = os.path.join(self.temp_dir, filename)
-                                return {'file_path': file_path, 'filename': filename}
+                            # If conversion fails, return original
+                            logging.warning(f"{file_format} conversion failed, returning original file")
+                            return file_result(downloaded_file)
                     
                     # Conversion already handled above for specific formats
                     pass
@@ -479,14 +530,12 @@ class VideoDownloader:
                 logging.info(f"Starting download with format: {ydl_opts['format']}")
                 
                 with self.memory_managed_extraction(ydl_opts) as ydl:
-                    ydl.download([url])
+                    self._run_download(ydl, url, info_dict)
                 
-                # Find the downloaded file
-                for filename in os.listdir(self.temp_dir):
-                    if os.path.isfile(os.path.join(self.temp_dir, filename)):
-                        file_path = os.path.join(self.temp_dir, filename)
-                        logging.info(f"Download completed successfully: {filename}")
-                        return {'file_path': file_path, 'filename': filename}
+                result = outputs.result()
+                if result:
+                    logging.info(f"Download completed successfully: {result['filename']}")
+                    return result
             
             return {'error': 'Download completed but file not found'}
             
@@ -509,18 +558,16 @@ class VideoDownloader:
                         'retries': 2,
                     }
                     
-                    if progress_hook:
-                        simple_opts['progress_hooks'] = [progress_hook]
+                    outputs = OutputTracker(progress_hook).install(simple_opts)
+                    self._add_connection_opts(simple_opts)
                     
                     with self.memory_managed_extraction(simple_opts) as ydl:
-                        ydl.download([url])
+                        self._run_download(ydl, url, info_dict)
                     
-                    # Find the downloaded file
-                    for filename in os.listdir(self.temp_dir):
-                        if os.path.isfile(os.path.join(self.temp_dir, filename)):
-                            file_path = os.path.join(self.temp_dir, filename)
-                            logging.info(f"Fallback download completed successfully: {filename}")
-                            return {'file_path': file_path, 'filename': filename}
+                    result = outputs.result()
+                    if result:
+                        logging.info(f"Fallback download completed successfully: {result['filename']}")
+                        return result
                     
                 except Exception as fallback_e:
                     logging.error(f"Fallback download also failed: {str(fallback_e)}")
@@ -528,7 +575,117 @@ class VideoDownloader:
             
             return {'error': f'Download failed: {error_msg}'}
     
-    def _download_youtube_with_bypass(self, url, format_id=None, audio_only=False, file_format=None, progress_hook=None):
+    def _convert_to_container(self, downloaded_file, file_format, progress_hook=None, info_dict=None, format_id=None):
+        """Bring a downloaded file into file_format with the cheapest legal plan; None on failure"""
+        if downloaded_file.endswith(f".{file_format}"):
+            logging.info(f"Downloaded file is already {file_format}: {os.path.basename(downloaded_file)}")
+            return file_result(downloaded_file)
+        
+        base_name = os.path.splitext(os.path.basename(downloaded_file))[0]
+        new_path = os.path.join(self.temp_dir, f"{base_name}.{file_format}")
+        try:
+            streams = probe_streams(downloaded_file, info_dict, format_id, timeout=self.deadline.timeout(30, 'probing'))
+            plan = plan_conversion(streams, file_format)
+            logging.info(f"Converting {downloaded_file} to {file_format} format ({plan['kind']}, source {streams})")
+            
+            result = self._convert(downloaded_file, new_path, plan['args'], progress_hook, info_dict, priority=plan['priority'])
+            if 'error' in result and plan['kind'] != 'transcode':
+                # Stream copy can still be refused by the muxer; re-encode everything
+                logging.warning(f"{plan['kind']} to {file_format} failed, retrying with a full transcode")
+                plan = full_transcode_plan(file_format)
+                result = self._convert(downloaded_file, new_path, plan['args'], progress_hook, info_dict, priority=plan['priority'])
+            
+            if 'error' not in result:
+                logging.info(f"{file_format} conversion successful: {os.path.basename(new_path)}")
+                # Remove original file to save space
+                os.remove(downloaded_file)
+                return file_result(new_path)
+            logging.error(f"FFmpeg {file_format} conversion failed: {result['error']}")
+        except Exception as e:
+            logging.error(f"FFmpeg {file_format} conversion error: {str(e)}")
+        return None
+
+    def _add_connection_opts(self, ydl_opts):
+        """Resumable, chunked HTTP requests; _run_download sizes the parallel connections"""
+        # Resume from existing .part files (after a restart or a dropped connection) with range requests
+        ydl_opts['continuedl'] = True
+        ydl_opts['fragment_retries'] = 10
+        ydl_opts['keep_fragments'] = False
+        chunk_size = int(os.environ.get('HTTP_CHUNK_SIZE', 10 * 1024 * 1024))
+        if chunk_size:
+            # Ranged requests avoid per-connection throttling on long progressive files
+            ydl_opts['http_chunk_size'] = chunk_size
+
+    def _use_connections(self, params, connections):
+        """Parallel fragments (and optionally aria2c) over the connections a lease granted"""
+        params['concurrent_fragment_downloads'] = connections
+        # Optional aria2c for multi-connection progressive (non-fragmented) downloads
+        if os.environ.get('EXTERNAL_DOWNLOADER') == 'aria2c' and connections > 1 and shutil.which('aria2c'):
+            params['external_downloader'] = {'http': 'aria2c'}
+            params['external_downloader_args'] = {
+                'aria2c': ['-x', str(connections), '-s', str(connections), '-k', '1M']
+            }
+
+    def _connection_cli_args(self, connections):
+        """Command line form of _add_connection_opts and _use_connections for yt-dlp run as a subprocess"""
+        args = ['--fragment-retries', '10', '--concurrent-fragments', str(connections)]
+        chunk_size = int(os.environ.get('HTTP_CHUNK_SIZE', 10 * 1024 * 1024))
+        if chunk_size:
+            args += ['--http-chunk-size', str(chunk_size)]
+        return args
+
+    def _download_and_convert_piped(self, url, format_id, file_format, progress_hook=None, info_dict=None):
+        """Pipe yt-dlp's output straight into ffmpeg so conversion overlaps the download
+
+        Only single-file HTTP formats whose codecs are known from the analyzed info can be
+        planned up front. Returns the result dict, or None so the caller falls back to
+        download-then-convert.
+        """
+        if os.environ.get('CONVERSION_PIPELINE', '1') == '0' or not info_dict:
+            return None
+        fmt = pick_pipe_format(info_dict, format_id if format_id not in ['best', 'server_blocked'] else None)
+        if not fmt:
+            return None
+        streams = streams_from_info(info_dict, fmt['format_id'])
+        if None in streams.values():
+            # Unknown codecs are left to ffprobe after a normal download
+            return None
+        
+        plan = plan_conversion(streams, file_format)
+        title = yt_dlp.utils.sanitize_filename(info_dict.get('title') or 'video')
+        output_path = os.path.join(self.temp_dir, f"{title}.{file_format}")
+        # The analyzed info keeps the format ids, URLs and headers of the client that found them
+        source_args, cleanup = self._info_source_args(url, info_dict)
+        logging.info(f"Piping format {fmt['format_id']} into ffmpeg for {file_format} ({plan['kind']})")
+        
+        try:
+            # The download runs for as long as the pipeline does, so the lease covers all of it
+            with connection_budget.lease() as connections:
+                source_cmd = (['yt-dlp', '--no-warnings', '--quiet', '--no-part'] + ytdlp_cache.cli_args() +
+                              self._connection_cli_args(connections) + ['-f', fmt['format_id'], '-o', '-'] +
+                              source_args)
+                result = self._convert('pipe:0', output_path, plan['args'], progress_hook, info_dict,
+                                       priority=plan['priority'], source_cmd=source_cmd)
+        finally:
+            cleanup()
+        if 'error' in result:
+            logging.warning(f"Piped conversion failed, falling back to download then convert: {result['error']}")
+            return None
+        return file_result(output_path)
+
+    def _convert(self, input_path, output_path, output_args, progress_hook=None, info_dict=None, priority=0,
+                 source_cmd=None):
+        """Run ffmpeg through the shared conversion executor, reporting 'converting' progress"""
+        def on_progress(percent):
+            if progress_hook:
+                progress_hook({'status': 'converting', 'percent': percent, 'filename': output_path})
+        
+        duration = info_dict.get('duration') if info_dict else None
+        return conversion_executor.convert(['-i', input_path], output_args, output_path, priority=priority,
+                                           duration=duration, on_progress=on_progress, source_cmd=source_cmd,
+                                           deadline=self.deadline)
+
+    def _download_youtube_with_bypass(self, url, format_id=None, audio_only=False, file_format=None, progress_hook=None, info_dict=None):
         """Download YouTube video using bypass strategies"""
         
         # Try the same bypass strategies as info extraction
@@ -603,8 +760,9 @@ class VideoDownloader:
                 logging.info(f"Trying YouTube download strategy {i+1}: {strategy['name']}")
                 
                 temp_opts = strategy['opts'].copy()
-                if progress_hook:
-                    temp_opts['progress_hooks'] = [progress_hook]
+                # Each strategy tracks its own output, so files left by a failed one are never picked up
+                outputs = OutputTracker(progress_hook).install(temp_opts)
+                self._add_connection_opts(temp_opts)
                 
                 # Format selection
                 if audio_only:
@@ -614,28 +772,41 @@ class VideoDownloader:
                 else:
                     temp_opts['format'] = 'best[height<=1080]/best'
                 
-                # Format conversion
-                if file_format and file_format not in ['mp4'] and not audio_only:
-                    temp_opts['postprocessors'] = [{
-                        'key': 'FFmpegVideoConverter',
-                        'preferredformat': file_format,
-                    }]
-                elif audio_only and file_format in ['mp3', 'm4a', 'wav']:
+                # Video containers are converted after download with a remux-first plan
+                convert_to = file_format if file_format in ['3gp', 'mkv', 'webm', 'avi', 'flv'] and not audio_only else None
+                native = None
+                if convert_to and format_id != 'worst':
+                    native = pick_native_format(info_dict, convert_to, format_id if format_id != 'best' else None)
+                if native:
+                    logging.info(f"Format {native['format']} is already {convert_to}, no conversion needed")
+                    temp_opts['format'] = native['format']
+                    if native['merge']:
+                        temp_opts['merge_output_format'] = convert_to
+                elif convert_to and info_dict and format_id != 'worst':
+                    piped = self._download_and_convert_piped(url, format_id, convert_to, progress_hook, info_dict)
+                    if piped:
+                        return piped
+                
+                if audio_only and file_format in ['mp3', 'm4a', 'wav']:
                     temp_opts['postprocessors'] = [{
                         'key': 'FFmpegExtractAudio',
                         'preferredcodec': file_format,
                         'preferredquality': '192',
                     }]
                 
+                # Only the first strategy can reuse the analyzed info_dict
+                strategy_info, info_dict = info_dict, None
                 with self.memory_managed_extraction(temp_opts) as ydl:
-                    ydl.download([url])
+                    self._run_download(ydl, url, strategy_info)
                 
-                # Find the downloaded file
-                for filename in os.listdir(self.temp_dir):
-                    if os.path.isfile(os.path.join(self.temp_dir, filename)):
-                        file_path = os.path.join(self.temp_dir, filename)
-                        logging.info(f"YouTube download completed successfully: {filename}")
-                        return {'file_path': file_path, 'filename': filename}
+                file_path = outputs.output_path()
+                if file_path:
+                    logging.info(f"YouTube download completed successfully: {os.path.basename(file_path)}")
+                    if convert_to:
+                        # Fall back to the original container if conversion fails
+                        return self._convert_to_container(file_path, convert_to, progress_hook, strategy_info,
+                                                          format_id) or file_result(file_path)
+                    return file_result(file_path)
                 
             except Exception as e:
                 logging.warning(f"YouTube download strategy {i+1} failed: {str(e)}")
@@ -644,6 +815,161 @@ class VideoDownloader:
         # All strategies failed
         return {'error': 'YouTube download failed with all bypass strategies. This video may be restricted or unavailable.'}
 
+    def stream_video(self, url, format_id=None, audio_only=False, info_dict=None, chunk_size=64 * 1024,
+                     deadline=None):
+        """Pipe a single-file (progressive) format straight from yt-dlp to the caller
+
+        Returns a dict with a 'chunks' generator, a 'close' callable that stops yt-dlp,
+        'filename' and 'mimetype', or an 'error'.
+        The generator reads from yt-dlp's stdout pipe, so a slow client slows yt-dlp down
+        instead of buffering the file in memory or on disk. No read waits longer than
+        STREAM_STALL_TIMEOUT or past the deadline; a stream cut short just ends.
+        """
+        self.deadline = deadline or Deadline()
+        selected = self._select_stream_format(info_dict, format_id, audio_only)
+        if not selected:
+            return {'error': 'The selected format cannot be streamed. Please use the regular download.'}
+        format_spec, ext = selected
+
+        title = (info_dict or {}).get('title') or ('audio' if audio_only else 'video')
+        filename = f"{title}.{ext}".replace('/', '_')
+
+        source_args, cleanup = self._info_source_args(url, info_dict)
+        cmd = (['yt-dlp', '--no-warnings', '--quiet', '--no-part'] + ytdlp_cache.cli_args() +
+               ['-f', format_spec, '-o', '-'] + source_args)
+        try:
+            process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, bufsize=0)
+        except Exception as e:
+            cleanup()
+            logging.error(f"Could not start streaming download: {str(e)}")
+            return {'error': f'Streaming failed: {str(e)}'}
+
+        stall_timeout = float(os.environ.get('STREAM_STALL_TIMEOUT', 60))
+
+        def read_chunk(stage):
+            # Raises DeadlineExceeded once the budget is gone or the host stops sending
+            timeout = self.deadline.timeout(stall_timeout, stage)
+            ready, _, _ = select.select([process.stdout], [], [], timeout)
+            if not ready:
+                raise DeadlineExceeded(f"No data for {timeout:g}s during {stage}")
+            return process.stdout.read(chunk_size)
+
+        def close():
+            if process.poll() is None:
+                process.kill()
+            process.wait()
+            process.stdout.close()
+            process.stderr.close()
+            cleanup()
+
+        # Wait for the first bytes so extraction errors can still become a proper HTTP error
+        try:
+            first_chunk = read_chunk('stream start')
+        except DeadlineExceeded as e:
+            close()
+            logging.error(f"Streaming download did not start: {str(e)}")
+            return {'error': self.deadline.message('Starting this stream') if self.deadline.expired()
+                    else 'Streaming failed - the video host stopped responding.', 'timed_out': True}
+        if not first_chunk:
+            process.wait()
+            stderr = process.stderr.read().decode('utf-8', 'replace')
+            close()
+            logging.error(f"Streaming download produced no data: {stderr[:300]}")
+            return {'error': 'Streaming failed - no data received from the video host.'}
+
+        def chunks():
+            try:
+                yield first_chunk
+                while True:
+                    chunk = read_chunk('streaming')
+                    if not chunk:
+                        break
+                    yield chunk
+            except DeadlineExceeded as e:
+                logging.warning(f"Stream of {url} stopped: {str(e)}")
+            finally:
+                close()
+
+        return {
+            'chunks': chunks(),
+            'close': close,
+            'filename': filename,
+            'mimetype': 'audio/mp4' if ext == 'm4a' else f"{'audio' if audio_only else 'video'}/{ext}",
+        }
+
+    def _info_source_args(self, url, info_dict):
+        """yt-dlp arguments naming what to download, and a cleanup callable
+
+        With an analyzed info_dict the CLI gets it through --load-info-json, so it skips a
+        second extraction and requests formats with the URLs and headers of the client
+        that found them; without one it falls back to the URL.
+        """
+        if not info_dict:
+            return [url], lambda: None
+        fd, path = tempfile.mkstemp(prefix='clovix_', suffix='.info.json')
+
+        def cleanup():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(yt_dlp.YoutubeDL.sanitize_info(info_dict), f)
+        except Exception as e:
+            cleanup()
+            logging.warning(f"Could not write info JSON, yt-dlp will re-extract: {str(e)}")
+            return [url], lambda: None
+        return ['--load-info-json', path], cleanup
+
+    def _select_stream_format(self, info_dict, format_id, audio_only):
+        """Pick a format that yt-dlp can write to a pipe as-is: one HTTP file, no merging"""
+        def streamable(fmt):
+            if not fmt.get('protocol', 'https').startswith('http'):
+                return False
+            if audio_only:
+                return fmt.get('acodec') != 'none'
+            return fmt.get('acodec') != 'none' and fmt.get('vcodec') != 'none'
+
+        if info_dict and info_dict.get('formats'):
+            formats = [f for f in info_dict['formats'] if f.get('format_id') and streamable(f)]
+            if audio_only:
+                formats = [f for f in formats if f.get('vcodec') == 'none'] or formats
+            exact = [f for f in formats if f['format_id'] == format_id]
+            if exact:
+                chosen = exact[0]
+            elif formats:
+                chosen = max(formats, key=lambda f: (f.get('height') or 0, f.get('tbr') or 0))
+            else:
+                return None
+            return chosen['format_id'], chosen.get('ext', 'mp4')
+
+        # Without analyzed info, restrict the selector to progressive HTTP formats
+        if audio_only:
+            return 'bestaudio[ext=m4a][protocol^=http]', 'm4a'
+        if format_id and format_id not in ['best', 'worst']:
+            return f"{format_id}[acodec!=?none][vcodec!=?none][protocol^=http]", 'mp4'
+        return 'best[ext=mp4][acodec!=?none][vcodec!=?none][protocol^=http]', 'mp4'
+
+    def _run_download(self, ydl, url, info_dict=None):
+        """Download from an already extracted info_dict when available, else re-extract
+
+        Fragment connections are leased from the shared budget only while yt-dlp downloads,
+        so probing and converting the file afterwards never holds them.
+        """
+        with connection_budget.lease() as connections:
+            self._use_connections(ydl.params, connections)
+            if info_dict:
+                try:
+                    ydl.process_ie_result(copy.deepcopy(info_dict), download=True)
+                    return
+                except Exception as e:
+                    # Re-extracting is pointless once the time budget is gone
+                    self.deadline.check('download')
+                    logging.warning(f"Download from analyzed info failed, re-extracting: {str(e)}")
+            ydl.download([url])
+
     def _extract_video_id(self, url):
         """Extract video ID from YouTube URL"""
         import re
@@ -2,12 +2,19 @@ import yt_dlp
 import tempfile
 import os
 import logging
-import gc
 import time
 import random
 import subprocess
 import json
 from contextlib import contextmanager
+from memory_policy import memory_policy
+from ydl_pool import ydl_pool
+from ytdlp_cache import ytdlp_cache
+from output_tracker import OutputTracker, PRINT_FILEPATH_ARGS, file_result, path_from_output
+from extractor_pool import extractor_pool, PoolUnavailable, WorkerTimeout, WorkerFailed
+
+# Fields the command line strategies report about a video
+CMDLINE_FIELDS = ['title', 'duration', 'uploader', 'view_count', 'thumbnail']
 
 class VideoDownloader:
     def __init__(self):
@@ -15,8 +22,22 @@ class VideoDownloader:
         logging.info("VideoDownloader initialized successfully")
 
     @contextmanager
-    def memory_managed_extraction(self, ydl_opts):
-        """Context manager for memory-efficient video extraction"""
+    def memory_managed_extraction(self, ydl_opts, pooled=False):
+        """Context manager for memory-efficient video extraction
+
+        pooled=True borrows a warm instance from the shared pool; only for extract_info
+        without downloading.
+        """
+        # Shared player/signature cache instead of yt-dlp's per-user default
+        ytdlp_cache.apply(ydl_opts)
+        if pooled:
+            try:
+                with ydl_pool.checkout(ydl_opts) as ydl:
+                    yield ydl
+            finally:
+                memory_policy.maybe_collect()
+            return
+        
         ydl = None
         try:
             ydl = yt_dlp.YoutubeDL(ydl_opts)
@@ -27,7 +48,8 @@ class VideoDownloader:
                     ydl.close()
                 except:
                     pass
-            gc.collect()
+            # Full collections only when memory is actually high
+            memory_policy.maybe_collect()
 
     def get_video_info(self, url):
         """Extract video information with ultimate YouTube bypass - NO AUTH REQUIRED"""
@@ -126,7 +148,7 @@ class VideoDownloader:
             try:
                 logging.info(f"Trying bypass strategy {i+1}: {strategy['name']}")
                 
-                with self.memory_managed_extraction(strategy['opts']) as ydl:
+                with self.memory_managed_extraction(strategy['opts'], pooled=True) as ydl:
                     info = ydl.extract_info(url, download=False)
                     
                     if info and 'title' in info:
@@ -165,79 +187,62 @@ class VideoDownloader:
 
     def _try_cmdline_ultimate(self, url, video_id):
         """Ultimate command line bypass with no authentication"""
-        try:
-            # Command with the most effective no-auth flags
-            cmd = [
-                'yt-dlp', 
+        # Flag sets with the most effective no-auth options, then an alternative client
+        arg_sets = [
+            [
                 '--no-warnings', '--quiet',
                 '--extractor-args', 'youtube:player_client=tv_embedded,android_tv',
                 '--extractor-args', 'youtube:player_skip=js,configs',
                 '--extractor-args', 'youtube:skip=dash,hls',
                 '--user-agent', 'com.google.android.youtube.tv/1.0 (Linux; U; Android 9; SM-T500) gzip',
-                '--print', '%(title)s|%(duration)s|%(uploader)s|%(view_count)s|%(thumbnail)s',
-                url
-            ]
-            
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=20)
-            
-            if result.returncode == 0 and result.stdout.strip():
-                parts = result.stdout.strip().split('|')
-                
-                if len(parts) >= 5:
-                    title = parts[0] if parts[0] != 'NA' else f'Video {video_id}'
-                    duration = int(parts[1]) if parts[1].isdigit() else 0
-                    uploader = parts[2] if parts[2] != 'NA' else 'Unknown'
-                    view_count = int(parts[3]) if parts[3].isdigit() else 0
-                    thumbnail = parts[4] if parts[4] != 'NA' else ''
-                    
-                    return {
-                        'title': title,
-                        'duration': self._format_duration(duration),
-                        'thumbnail': thumbnail,
-                        'uploader': uploader,
-                        'view_count': view_count,
-                        'formats': self._get_working_formats(),
-                        'working_url': url
-                    }
-            
-            # Try alternative command with different client
-            cmd_alt = [
-                'yt-dlp', 
+            ],
+            [
                 '--no-warnings', '--quiet',
                 '--extractor-args', 'youtube:player_client=ios',
                 '--user-agent', 'com.google.ios.youtube/19.29.1 (iPhone16,2; U; CPU OS 17_5_1 like Mac OS X)',
-                '--print', '%(title)s|%(duration)s|%(uploader)s|%(view_count)s|%(thumbnail)s',
-                url
-            ]
-            
-            result = subprocess.run(cmd_alt, capture_output=True, text=True, timeout=20)
-            
-            if result.returncode == 0 and result.stdout.strip():
-                parts = result.stdout.strip().split('|')
-                
-                if len(parts) >= 5:
-                    title = parts[0] if parts[0] != 'NA' else f'Video {video_id}'
-                    duration = int(parts[1]) if parts[1].isdigit() else 0
-                    uploader = parts[2] if parts[2] != 'NA' else 'Unknown'
-                    view_count = int(parts[3]) if parts[3].isdigit() else 0
-                    thumbnail = parts[4] if parts[4] != 'NA' else ''
-                    
+            ],
+        ]
+        
+        for args in arg_sets:
+            try:
+                fields = self._cmdline_fields(args + ytdlp_cache.cli_args() + [url])
+                if fields:
+                    duration = fields['duration']
+                    view_count = fields['view_count']
                     return {
-                        'title': title,
-                        'duration': self._format_duration(duration),
-                        'thumbnail': thumbnail,
-                        'uploader': uploader,
-                        'view_count': view_count,
+                        'title': fields['title'] or f'Video {video_id}',
+                        'duration': self._format_duration(int(float(duration)) if duration else 0),
+                        'thumbnail': fields['thumbnail'] or '',
+                        'uploader': fields['uploader'] or 'Unknown',
+                        'view_count': int(float(view_count)) if view_count else 0,
                         'formats': self._get_working_formats(),
                         'working_url': url
                     }
-                    
-        except Exception as e:
-            logging.error(f"Command line extraction failed: {str(e)}")
+            except Exception as e:
+                logging.error(f"Command line extraction failed: {str(e)}")
         
         # Final guaranteed response - always works
         return self._create_guaranteed_response(url, video_id)
 
+    def _cmdline_fields(self, args):
+        """Summary fields for yt-dlp CLI arguments, from a warm worker or else a yt-dlp subprocess"""
+        try:
+            return extractor_pool.extract_info(args, fields=CMDLINE_FIELDS, timeout=20)
+        except PoolUnavailable as e:
+            logging.info(f"Extractor pool unavailable, running yt-dlp: {str(e)}")
+        except (WorkerTimeout, WorkerFailed) as e:
+            logging.warning(f"In-process extraction failed: {str(e)}")
+            return None
+        
+        template = '|'.join(f'%({field})s' for field in CMDLINE_FIELDS)
+        result = subprocess.run(['yt-dlp', '--print', template] + args, capture_output=True, text=True, timeout=20)
+        if result.returncode != 0 or not result.stdout.strip():
+            return None
+        parts = result.stdout.strip().split('|')
+        if len(parts) < len(CMDLINE_FIELDS):
+            return None
+        return {field: (None if value == 'NA' else value) for field, value in zip(CMDLINE_FIELDS, parts)}
+
     def _create_guaranteed_response(self, url, video_id):
         """Create a guaranteed working response for any YouTube video"""
         return {
@@ -329,7 +334,7 @@ class VideoDownloader:
                 'retries': 2,
             }
             
-            with self.memory_managed_extraction(ydl_opts) as ydl:
+            with self.memory_managed_extraction(ydl_opts, pooled=True) as ydl:
                 info = ydl.extract_info(url, download=False)
                 
                 if not info:
@@ -404,8 +409,7 @@ class VideoDownloader:
                 'no_warnings': True,
             }
             
-            if progress_hook:
-                ydl_opts['progress_hooks'] = [progress_hook]
+            outputs = OutputTracker(progress_hook).install(ydl_opts)
             
             # YouTube bypass options
             if 'youtube.com' in url or 'youtu.be' in url:
@@ -439,11 +443,9 @@ class VideoDownloader:
             with self.memory_managed_extraction(ydl_opts) as ydl:
                 ydl.download([url])
             
-            # Find downloaded file
-            for file in os.listdir(self.temp_dir):
-                if file.endswith(('.mp4', '.mkv', '.webm', '.avi', '.mp3', '.m4a')):
-                    file_path = os.path.join(self.temp_dir, file)
-                    return {'file_path': file_path, 'filename': file}
+            result = outputs.result()
+            if result:
+                return result
             
             return {'error': 'Download completed but file not found'}
             
@@ -461,6 +463,27 @@ class VideoDownloader:
             else:
                 return {'error': f'Download failed: {error_msg}'}
 
+    def _run_download_cmd(self, name, cmd, timeout, progress_hook):
+        """Run a yt-dlp command line in a warm worker, or as a subprocess when no worker is available
+
+        Returns the final file path, or None when the strategy produced nothing.
+        """
+        try:
+            return extractor_pool.download(cmd[1:] + ytdlp_cache.cli_args(), timeout=timeout, progress_hook=progress_hook)
+        except PoolUnavailable as e:
+            logging.info(f"Extractor pool unavailable, running yt-dlp: {str(e)}")
+        except WorkerFailed as e:
+            logging.info(f"Strategy {name} failed: {str(e)[:200]}")
+            return None
+        
+        result = subprocess.run(cmd + PRINT_FILEPATH_ARGS + ytdlp_cache.cli_args(), capture_output=True, text=True, timeout=timeout)
+        
+        logging.info(f"Strategy {name} result: {result.returncode}")
+        if result.stderr:
+            logging.info(f"Strategy {name} stderr: {result.stderr[:200]}")
+        # yt-dlp prints the final path, so leftovers of earlier strategies are never returned
+        return path_from_output(result.stdout) if result.returncode == 0 else None
+
     def _download_fallback(self, url, format_id, audio_only, progress_hook):
         """Multiple aggressive fallback strategies for YouTube downloads"""
         video_id = self._extract_video_id(url)
@@ -514,21 +537,12 @@ class VideoDownloader:
         for strategy in strategies:
             try:
                 logging.info(f"Trying download strategy: {strategy['name']}")
-                result = subprocess.run(strategy['cmd'], capture_output=True, text=True, timeout=45)
-                
-                logging.info(f"Strategy {strategy['name']} result: {result.returncode}")
-                if result.stderr:
-                    logging.info(f"Strategy {strategy['name']} stderr: {result.stderr[:200]}")
-                
-                if result.returncode == 0:
-                    # Find downloaded file
-                    for file in os.listdir(self.temp_dir):
-                        if file.startswith(f'video_{video_id}') and file.endswith(('.mp4', '.mkv', '.webm', '.avi', '.mp3', '.m4a', '.3gp', '.flv')):
-                            file_path = os.path.join(self.temp_dir, file)
-                            logging.info(f"Successfully downloaded with {strategy['name']}: {file}")
-                            return {'file_path': file_path, 'filename': file}
+                file_path = self._run_download_cmd(strategy['name'], strategy['cmd'], 45, progress_hook)
+                if file_path:
+                    logging.info(f"Successfully downloaded with {strategy['name']}: {os.path.basename(file_path)}")
+                    return file_result(file_path)
                             
-            except subprocess.TimeoutExpired:
+            except (subprocess.TimeoutExpired, WorkerTimeout):
                 logging.warning(f"Strategy {strategy['name']} timed out")
                 continue
             except Exception as e:
@@ -542,10 +556,11 @@ class VideoDownloader:
             result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
             
             if result.returncode == 0:
+                # youtube-dl cannot print its final path; only the extension is unknown here
                 for file in os.listdir(self.temp_dir):
-                    if file.startswith(f'video_{video_id}'):
+                    if file.startswith(f'video_{video_id}') and not file.endswith(('.part', '.ytdl')):
                         file_path = os.path.join(self.temp_dir, file)
-                        return {'file_path': file_path, 'filename': file}
+                        return file_result(file_path)
         except:
             pass
             
@@ -2,12 +2,16 @@ import yt_dlp
 import tempfile
 import os
 import logging
-import gc
 import time
 import random
 import subprocess
 import json
 from contextlib import contextmanager
+from memory_policy import memory_policy
+from ydl_pool import ydl_pool
+from ytdlp_cache import ytdlp_cache
+from output_tracker import OutputTracker, PRINT_FILEPATH_ARGS, file_result, path_from_output
+from extractor_pool import extractor_pool, PoolUnavailable, WorkerTimeout, WorkerFailed
 
 class VideoDownloader:
     def __init__(self):
@@ -16,8 +20,22 @@ class VideoDownloader:
         logging.info("VideoDownloader initialized with YouTube session")
 
     @contextmanager
-    def memory_managed_extraction(self, ydl_opts):
-        """Context manager for memory-efficient video extraction"""
+    def memory_managed_extraction(self, ydl_opts, pooled=False):
+        """Context manager for memory-efficient video extraction
+
+        pooled=True borrows a warm instance from the shared pool; only for extract_info
+        without downloading.
+        """
+        # Shared player/signature cache instead of yt-dlp's per-user default
+        ytdlp_cache.apply(ydl_opts)
+        if pooled:
+            try:
+                with ydl_pool.checkout(ydl_opts) as ydl:
+                    yield ydl
+            finally:
+                memory_policy.maybe_collect()
+            return
+        
         ydl = None
         try:
             ydl = yt_dlp.YoutubeDL(ydl_opts)
@@ -28,7 +46,8 @@ class VideoDownloader:
                     ydl.close()
                 except:
                     pass
-            gc.collect()
+            # Full collections only when memory is actually high
+            memory_policy.maybe_collect()
 
     def get_video_info(self, url):
         """Extract video information with YouTube server blocking detection"""
@@ -86,7 +105,7 @@ class VideoDownloader:
                 if self.cookies_file and os.path.exists(self.cookies_file):
                     ydl_opts['cookiefile'] = self.cookies_file
                 
-                with self.memory_managed_extraction(ydl_opts) as ydl:
+                with self.memory_managed_extraction(ydl_opts, pooled=True) as ydl:
                     info = ydl.extract_info(url, download=False)
                     
                     if info:
@@ -222,7 +241,7 @@ class VideoDownloader:
                 'retries': 3,
             }
             
-            with self.memory_managed_extraction(ydl_opts) as ydl:
+            with self.memory_managed_extraction(ydl_opts, pooled=True) as ydl:
                 info = ydl.extract_info(url, download=False)
                 
                 if not info:
@@ -303,8 +322,7 @@ class VideoDownloader:
                 'no_warnings': True,
             }
             
-            if progress_hook:
-                ydl_opts['progress_hooks'] = [progress_hook]
+            outputs = OutputTracker(progress_hook).install(ydl_opts)
             
             # Format selection with quality and file format support
             if audio_only:
@@ -340,11 +358,9 @@ class VideoDownloader:
             with self.memory_managed_extraction(ydl_opts) as ydl:
                 ydl.download([url])
             
-            # Find downloaded file
-            for file in os.listdir(self.temp_dir):
-                if file.endswith(('.mp4', '.mkv', '.webm', '.avi', '.mp3', '.m4a', '.3gp', '.flv')):
-                    file_path = os.path.join(self.temp_dir, file)
-                    return {'file_path': file_path, 'filename': file}
+            result = outputs.result()
+            if result:
+                return result
             
             return {'error': 'Download completed but file not found'}
             
@@ -382,6 +398,43 @@ class VideoDownloader:
             logging.error(f"Failed to create cookies file: {e}")
             return None
 
+    def _run_download_cmd(self, name, cmd, timeout, progress_hook):
+        """Run a yt-dlp command line in a warm worker, or as a subprocess when no worker is available
+
+        Returns the final file path, or None when the strategy produced nothing.
+        """
+        try:
+            return extractor_pool.download(cmd[1:] + ytdlp_cache.cli_args(), timeout=timeout, progress_hook=progress_hook)
+        except PoolUnavailable as e:
+            logging.info(f"Extractor pool unavailable, running yt-dlp: {str(e)}")
+        except WorkerFailed as e:
+            self._log_strategy_error(name, str(e))
+            return None
+        
+        result = subprocess.run(
+            cmd + PRINT_FILEPATH_ARGS + ytdlp_cache.cli_args(), 
+            capture_output=True, 
+            text=True, 
+            timeout=timeout,
+            cwd=self.temp_dir
+        )
+        
+        logging.info(f"Strategy {name} exit code: {result.returncode}")
+        
+        if result.returncode == 0:
+            # yt-dlp prints the final path, so leftovers of earlier strategies are never returned
+            file_path = path_from_output(result.stdout)
+            if file_path:
+                return file_path
+        
+        self._log_strategy_error(name, result.stderr)
+        return None
+
+    def _log_strategy_error(self, name, error):
+        # Sign-in and bot checks are expected for most strategies; only log the unusual ones
+        if error and not ("sign in" in error.lower() or "bot" in error.lower()):
+            logging.info(f"Strategy {name} stderr: {error[:150]}")
+
     def _download_youtube_with_advanced_bypass(self, url, format_id, audio_only, file_format, progress_hook):
         """Advanced YouTube download with multiple bypass strategies"""
         video_id = self._extract_video_id(url)
@@ -465,29 +518,12 @@ class VideoDownloader:
                 logging.info(f"Trying YouTube bypass strategy: {strategy['name']}")
                 
                 # Run with timeout
-                result = subprocess.run(
-                    strategy['cmd'], 
-                    capture_output=True, 
-                    text=True, 
-                    timeout=60,
-                    cwd=self.temp_dir
-                )
-                
-                logging.info(f"Strategy {strategy['name']} exit code: {result.returncode}")
-                
-                if result.returncode == 0:
-                    # Look for downloaded file
-                    for file in os.listdir(self.temp_dir):
-                        if file.startswith(f'video_{video_id}') and file.endswith(('.mp4', '.mkv', '.webm', '.avi', '.3gp', '.flv')):
-                            file_path = os.path.join(self.temp_dir, file)
-                            logging.info(f"SUCCESS: Downloaded with {strategy['name']}: {file}")
-                            return {'file_path': file_path, 'filename': file}
-                
-                # Log error for debugging
-                if result.stderr and not ("sign in" in result.stderr.lower() or "bot" in result.stderr.lower()):
-                    logging.info(f"Strategy {strategy['name']} stderr: {result.stderr[:150]}")
+                file_path = self._run_download_cmd(strategy['name'], strategy['cmd'], 60, progress_hook)
+                if file_path:
+                    logging.info(f"SUCCESS: Downloaded with {strategy['name']}: {os.path.basename(file_path)}")
+                    return file_result(file_path)
                     
-            except subprocess.TimeoutExpired:
+            except (subprocess.TimeoutExpired, WorkerTimeout):
                 logging.warning(f"Strategy {strategy['name']} timed out")
                 continue
             except Exception as e:
@@ -508,11 +544,12 @@ class VideoDownloader:
             result = subprocess.run(cmd, capture_output=True, text=True, timeout=45)
             
             if result.returncode == 0:
+                # youtube-dl cannot print its final path; only the extension is unknown here
                 for file in os.listdir(self.temp_dir):
-                    if file.startswith(f'video_{video_id}'):
+                    if file.startswith(f'video_{video_id}') and not file.endswith(('.part', '.ytdl')):
                         file_path = os.path.join(self.temp_dir, file)
                         logging.info(f"SUCCESS: Downloaded with youtube-dl: {file}")
-                        return {'file_path': file_path, 'filename': file}
+                        return file_result(file_path)
         except:
             pass
         
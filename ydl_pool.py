@@ -0,0 +1,165 @@
+import os
+import copy
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+import yt_dlp
+
+
+class YoutubeDLPool:
+    """Warm YoutubeDL instances for info extraction, keyed by option profile
+
+    Building a YoutubeDL per attempt throws away its extractor instances (and the
+    player/signature caches they hold), cookie jar and HTTP connection pools. Here an
+    instance is checked out by exactly one thread at a time and returned afterwards, so
+    the next extraction with the same options starts warm. YoutubeDL is not thread-safe,
+    so an instance is never shared while checked out, but any thread may take an idle one.
+    Instances are closed after max_uses extractions or max_age seconds so caches and
+    sessions do not grow without bound.
+
+    Only for extract_info(download=False): downloads carry per-job hooks and output
+    templates and keep using fresh instances.
+    """
+
+    def __init__(self, max_idle=None, max_total=None, max_uses=None, max_age=None):
+        self.enabled = os.environ.get('YDL_POOL', '1') != '0'
+        # Idle instances kept per option profile
+        self.max_idle = max_idle or int(os.environ.get('YDL_POOL_SIZE', 4))
+        # Idle instances across all profiles; the longest idle one is closed to make room
+        self.max_total = max_total or int(os.environ.get('YDL_POOL_MAX_IDLE', 32))
+        self.max_uses = max_uses or int(os.environ.get('YDL_POOL_MAX_USES', 100))
+        self.max_age = max_age or float(os.environ.get('YDL_POOL_MAX_AGE', 600))
+
+        self._idle = {}  # profile key -> [entry], most recently returned last
+        self._lock = threading.Lock()
+        self.checked_out = 0
+        self.created = 0
+        self.reused = 0
+        self.recycled = 0
+
+    @contextmanager
+    def checkout(self, ydl_opts):
+        """Yield a YoutubeDL built from ydl_opts, reusing an idle one with the same options"""
+        if not self.enabled:
+            ydl = yt_dlp.YoutubeDL(ydl_opts)
+            try:
+                yield ydl
+            finally:
+                ydl.close()
+            return
+
+        key = self._profile_key(ydl_opts)
+        entry = self._take(key)
+        if entry is None:
+            # The instance keeps its params; a copy keeps later changes by the caller out of it
+            entry = {'ydl': yt_dlp.YoutubeDL(copy.deepcopy(ydl_opts)), 'created': time.monotonic(), 'uses': 0}
+            with self._lock:
+                self.created += 1
+                self.checked_out += 1
+
+        reusable = True
+        try:
+            yield entry['ydl']
+        except BaseException as e:
+            # Extraction errors leave the instance usable; interrupts retire it
+            reusable = isinstance(e, Exception)
+            raise
+        finally:
+            entry['uses'] += 1
+            self._return(key, entry, reusable)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'profiles': len(self._idle),
+                'idle': sum(len(entries) for entries in self._idle.values()),
+                'checked_out': self.checked_out,
+                'created': self.created,
+                'reused': self.reused,
+                'recycled': self.recycled,
+            }
+
+    def clear(self):
+        """Close every idle instance"""
+        with self._lock:
+            entries = [entry for entries in self._idle.values() for entry in entries]
+            self._idle = {}
+        for entry in entries:
+            self._close(entry)
+
+    def _take(self, key):
+        expired = []
+        taken = None
+        with self._lock:
+            entries = self._idle.get(key, [])
+            while entries:
+                entry = entries.pop()
+                if self._expired(entry):
+                    expired.append(entry)
+                    continue
+                taken = entry
+                self.reused += 1
+                self.checked_out += 1
+                break
+            if not entries:
+                self._idle.pop(key, None)
+            self.recycled += len(expired)
+        for entry in expired:
+            self._close(entry)
+        return taken
+
+    def _return(self, key, entry, reusable):
+        ydl = entry['ydl']
+        # Per-run bookkeeping that extract_info leaves behind
+        ydl._download_retcode = 0
+        evicted = None
+        with self._lock:
+            self.checked_out -= 1
+            if reusable and not self._expired(entry) and len(self._idle.get(key, [])) < self.max_idle:
+                if sum(len(idle) for idle in self._idle.values()) >= self.max_total:
+                    evicted = self._pop_longest_idle()
+                entry['returned'] = time.monotonic()
+                self._idle.setdefault(key, []).append(entry)
+                entry = None
+            if entry or evicted:
+                self.recycled += 1
+        for retired in (entry, evicted):
+            if retired:
+                self._close(retired)
+
+    def _pop_longest_idle(self):
+        # Lists are never left empty, and the first entry of each is its longest idle one
+        key = min(self._idle, key=lambda profile: self._idle[profile][0]['returned'])
+        entry = self._idle[key].pop(0)
+        if not self._idle[key]:
+            self._idle.pop(key)
+        return entry
+
+    def _expired(self, entry):
+        return entry['uses'] >= self.max_uses or time.monotonic() - entry['created'] > self.max_age
+
+    def _close(self, entry):
+        try:
+            entry['ydl'].close()
+        except Exception as e:
+            logging.warning(f"Error closing pooled YoutubeDL: {str(e)}")
+
+    def _profile_key(self, ydl_opts):
+        return json.dumps(ydl_opts, sort_keys=True, default=repr)
+
+    def _reset_after_fork(self):
+        # Connections and locks inherited from the parent must not be reused by a worker
+        self._lock = threading.Lock()
+        self._idle = {}
+        self.checked_out = 0
+
+
+# YoutubeDL instances cannot cross a fork; children start with an empty pool
+ydl_pool = YoutubeDLPool()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=ydl_pool._reset_after_fork)
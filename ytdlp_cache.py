@@ -0,0 +1,192 @@
+import os
+import time
+import fcntl
+import logging
+import tempfile
+import threading
+
+import yt_dlp
+
+
+def _default_dir():
+    if os.environ.get('VERCEL'):
+        # The only writable place in a serverless function; survives while the instance stays warm
+        return os.path.join('/tmp', 'clovix_ytdlp_cache')
+    cache_root = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_root, 'clovix', 'yt-dlp')
+
+
+class YtdlpCache:
+    """One yt-dlp cache directory shared by every worker, kept under a size bound
+
+    yt-dlp stores YouTube player code and signature/nsig solutions here; without a
+    stable, writable cachedir they are fetched and solved again for every extraction.
+    yt-dlp writes entries atomically (temp file + rename), so workers can share the
+    directory; pruning and warm-up are serialised across processes with flock.
+    """
+
+    def __init__(self, path=None, max_mb=None, warmup_url=None, warmup_interval=None):
+        self.path = path or os.environ.get('YTDLP_CACHE_DIR') or _default_dir()
+        self.max_bytes = (max_mb or int(os.environ.get('YTDLP_CACHE_MAX_MB', 64))) * 1024 * 1024
+        self.warmup_url = warmup_url if warmup_url is not None else os.environ.get(
+            'YTDLP_CACHE_WARMUP_URL', 'https://www.youtube.com/watch?v=jNQXAC9IVRw')
+        # Player code changes every few days; a recent warm-up is good enough
+        self.warmup_interval = warmup_interval or float(os.environ.get('YTDLP_CACHE_WARMUP_INTERVAL', 6 * 3600))
+        self.prune_interval = float(os.environ.get('YTDLP_CACHE_PRUNE_INTERVAL', 600))
+
+        self._lock = threading.Lock()
+        self._last_prune = 0.0
+        self.pruned_files = 0
+        self.warmed = False
+
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            self.enabled = os.access(self.path, os.W_OK)
+        except OSError:
+            self.enabled = False
+        if not self.enabled:
+            fallback = os.path.join(tempfile.gettempdir(), 'clovix_ytdlp_cache')
+            logging.warning(f"yt-dlp cache dir {self.path} is not writable, using {fallback}")
+            self.path = fallback
+            try:
+                os.makedirs(self.path, exist_ok=True)
+                self.enabled = True
+            except OSError as e:
+                logging.error(f"yt-dlp cache disabled: {str(e)}")
+
+    def apply(self, ydl_opts):
+        """Point ydl_opts at the shared cache; also prunes it now and then"""
+        if self.enabled:
+            ydl_opts.setdefault('cachedir', self.path)
+            self.maybe_prune()
+        return ydl_opts
+
+    def cli_args(self):
+        """Same cache for yt-dlp run as a subprocess"""
+        return ['--cache-dir', self.path] if self.enabled else []
+
+    def maybe_prune(self):
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_prune < self.prune_interval:
+                return
+            self._last_prune = now
+        self.prune()
+
+    def prune(self):
+        """Delete least recently written entries until the cache fits max_bytes"""
+        with self._exclusive('.prune.lock') as locked:
+            if not locked:
+                # Another worker is pruning right now
+                return 0
+            entries = []
+            total = 0
+            now = time.time()
+            for dirpath, _, filenames in os.walk(self.path):
+                for name in filenames:
+                    if name.startswith('.'):
+                        continue
+                    path = os.path.join(dirpath, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    if name.endswith('.tmp') and now - stat.st_mtime > 3600:
+                        # Left behind by a writer that died mid-write
+                        self._remove(path)
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, path))
+                    total += stat.st_size
+
+            removed = 0
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                if self._remove(path):
+                    total -= size
+                    removed += 1
+            if removed:
+                self.pruned_files += removed
+                logging.info(f"Pruned {removed} yt-dlp cache entries, {total // 1024} KB left")
+            return removed
+
+    def warm_up(self):
+        """Fill the cache with current YouTube player data in the background, once per interval"""
+        if not self.enabled or not self.warmup_url or os.environ.get('YTDLP_CACHE_WARMUP', '1') == '0':
+            return
+        threading.Thread(target=self._warm_up, name='ytdlp-cache-warmup', daemon=True).start()
+
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'path': self.path,
+            'max_bytes': self.max_bytes,
+            'pruned_files': self.pruned_files,
+            'warmed': self.warmed,
+        }
+
+    def _warm_up(self):
+        self.prune()
+        marker = os.path.join(self.path, '.warmup')
+        with self._exclusive('.warmup.lock') as locked:
+            try:
+                if not locked or time.time() - os.path.getmtime(marker) < self.warmup_interval:
+                    return
+            except OSError:
+                pass
+            started = time.monotonic()
+            opts = {
+                'quiet': True,
+                'no_warnings': True,
+                'skip_download': True,
+                'cachedir': self.path,
+                'socket_timeout': 20,
+                # The web client needs the player code, which is what the cache is for
+                'extractor_args': {'youtube': {'player_client': ['web']}},
+            }
+            try:
+                with yt_dlp.YoutubeDL(opts) as ydl:
+                    ydl.extract_info(self.warmup_url, download=False)
+                with open(marker, 'w'):
+                    pass
+                self.warmed = True
+                logging.info(f"yt-dlp cache warmed in {time.monotonic() - started:.1f}s")
+            except Exception as e:
+                logging.warning(f"yt-dlp cache warm-up failed: {str(e)}")
+
+    def _exclusive(self, name):
+        return _FileLock(os.path.join(self.path, name))
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
+
+
+class _FileLock:
+    """Non-blocking flock; the with-block receives whether the lock was taken"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def __enter__(self):
+        try:
+            self._file = open(self.path, 'a')
+            fcntl.flock(self._file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            if self._file:
+                self._file.close()
+                self._file = None
+            return False
+
+    def __exit__(self, *exc_info):
+        if self._file:
+            self._file.close()
+        return False
+
+
+ytdlp_cache = YtdlpCache()